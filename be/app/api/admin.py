@@ -2,18 +2,19 @@ from __future__ import annotations
 
 from fastapi import APIRouter, Depends
 
+from app.api.responses import ORJSONResponse
 from app.core.config import get_settings
-from app.core.db import conn_ctx
+from app.core.db import conn_ctx, read_conn_ctx
 from app.core.roles import format_roles, parse_roles
 from app.core.security import require_admin
-from app.services.airdrop import compute_allocations, recompute_and_store
+from app.services.airdrop import compute_allocations, compute_breakdown_map, recompute_and_store
 
 router = APIRouter(prefix="/v1/admin", dependencies=[Depends(require_admin)])
 
 @router.get("/users")
 def list_users():
     """Admin: list all users (wallet_id, role, access_info, timestamps)."""
-    with conn_ctx() as conn:
+    with read_conn_ctx() as conn:
         rows = conn.execute(
             "SELECT wallet_id, role, access_info, created_at, updated_at FROM users ORDER BY created_at DESC"
         ).fetchall()
@@ -22,7 +23,7 @@ def list_users():
         roles = parse_roles(r[1])
         users.append(
             {
-                "wallet_id": str(r[0]).upper(),
+                "wallet_id": r[0],
                 "role": format_roles(roles),
                 "roles": list(roles),
                 "access_info": int(r[2] or 0),
@@ -30,15 +31,16 @@ def list_users():
                 "updated_at": r[4],
             }
         )
-    return {"users": users}
+    # rows are plain JSON types already; skip the jsonable_encoder pass
+    return ORJSONResponse({"users": users})
 
 
 @router.get("/res")
 def list_res():
     """Admin: full res table with per-role airdrop breakdown."""
     settings = get_settings()
-    with conn_ctx() as conn:
-        allocs = compute_allocations(conn, settings)
+    with read_conn_ctx() as conn:
+        breakdowns = compute_breakdown_map(conn, settings)
         rows = conn.execute(
             """
             SELECT r.wallet_id, u.role, r.qubic_bal, r.qearn_bal, r.portal_bal, r.qxmr_bal, r.created_at, r.updated_at
@@ -48,16 +50,16 @@ def list_res():
             """
         ).fetchall()
 
-    def amt(wallet: str, role: str) -> int:
-        return int(allocs.get(role, {}).get(wallet, 0))
+    no_allocation = {"community": 0, "portal": 0, "power": 0}
 
     out = []
     for idx, r in enumerate(rows, start=1):
-        wallet_id = str(r[0]).upper()
+        wallet_id = r[0]
         roles = parse_roles(r[1])
-        community_amt = amt(wallet_id, "community")
-        portal_amt = amt(wallet_id, "portal")
-        power_amt = amt(wallet_id, "power")
+        breakdown = breakdowns.get(wallet_id, no_allocation)
+        community_amt = breakdown["community"]
+        portal_amt = breakdown["portal"]
+        power_amt = breakdown["power"]
         total_amt = community_amt + portal_amt + power_amt
         out.append(
             {
@@ -82,14 +84,14 @@ def list_res():
     # renumber after sort
     for i, r in enumerate(out, start=1):
         r["no"] = i
-    return {"res": out}
+    return ORJSONResponse({"res": out})
 
 
 @router.get("/allocations")
 def allocations():
     """Admin: summarize allocations per role based on current snapshots."""
     settings = get_settings()
-    with conn_ctx() as conn:
+    with read_conn_ctx() as conn:
         allocs = compute_allocations(conn, settings)
 
     def summarize(d: dict[str, int]):
@@ -1,21 +1,31 @@
 from __future__ import annotations
 
-from pydantic import BaseModel, Field
+from typing import Annotated
+
+from pydantic import BaseModel, Field, StringConstraints
+
+# Same rule as app.core.qubic.normalize_identity, enforced by pydantic-core while the
+# body is parsed: surrounding whitespace is stripped, then the pattern is checked
+# (either case), then the value is uppercased to its canonical form.
+WalletId = Annotated[
+    str,
+    StringConstraints(strip_whitespace=True, to_upper=True, pattern=r"^(?:[A-Za-z]{60}|[A-Za-z]{66})$"),
+]
 
 
 class WalletRequest(BaseModel):
-    walletId: str = Field(..., description="Qubic identity (60 uppercase letters)")
+    walletId: WalletId = Field(..., description="Qubic identity: 60 or 66 letters, any case; trimmed and uppercased")
 
 
 class ConfirmTxRequest(BaseModel):
-    walletId: str
+    walletId: WalletId
     txId: str
 
 
 class TxLogRequest(BaseModel):
-    wallet_id: str
-    from_id: str
-    to_id: str
+    wallet_id: WalletId
+    from_id: WalletId
+    to_id: WalletId
     txId: str
     type: str
     amount: int = 0
@@ -1,20 +1,22 @@
 from __future__ import annotations
 
 import asyncio
+import sqlite3
 from datetime import datetime, timezone
+from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from app.api.models import ConfirmTxRequest, TxLogRequest
-from app.core.config import get_settings
-from app.core.db import conn_ctx
+from app.core.config import Settings, get_settings
+from app.core.db import conn_ctx, read_conn_ctx
 from app.core.qubic import asset_name_value, identity_to_public_key_bytes, normalize_identity
 from app.core.roles import format_roles, parse_roles, resolve_roles
 from app.core.security import require_admin
-from app.services.airdrop import airdrop_breakdown_for_wallet, airdrop_for_wallet, recompute_and_store
-from app.services.assets import fetch_asset_units, fetch_portal_amount, fetch_qearn_amount, fetch_qxmr_amount
+from app.services.airdrop import airdrop_breakdown_for_wallet
+from app.services.assets import fetch_balance_bundle
 from app.services.rpc import QubicRpcClient, RpcError
-from app.services.storage import ensure_user, set_user_role, update_airdrop_amount, upsert_res_snapshot
+from app.services.storage import ensure_user, is_registered, set_user_role, update_airdrop_amount, upsert_res_snapshot
 
 router = APIRouter()
 
@@ -52,6 +54,91 @@ def get_config():
     }
 
 
+def _cached_summary(wallet: str, settings: Settings) -> dict[str, Any] | None:
+    """Recent stored snapshot for `wallet`, or None when missing or older than the cache window."""
+    with read_conn_ctx() as conn:
+        cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
+        cached = cur.execute(
+            """
+            SELECT u.access_info,
+                   u.role,
+                   r.qubic_bal,
+                   r.qearn_bal,
+                   r.portal_bal,
+                   r.qxmr_bal,
+                   r.airdrop_amt,
+                   r.updated_at
+            FROM users u
+            LEFT JOIN res r ON r.wallet_id = u.wallet_id
+            WHERE u.wallet_id = ?
+            """,
+            (wallet,),
+        ).fetchone()
+        if cached and cached["updated_at"]:
+            try:
+                updated_at = datetime.fromisoformat(str(cached["updated_at"])).replace(tzinfo=None)
+                age = (datetime.utcnow() - updated_at).total_seconds()
+            except Exception:
+                age = CACHE_TTL_SECONDS + 1
+            if age <= CACHE_TTL_SECONDS:
+                registered = bool(cached["access_info"] == 1)
+                roles = parse_roles(cached["role"])
+                qubic_bal_raw = int(cached["qubic_bal"] or 0)
+                return {
+                    "wallet_id": wallet,
+                    "registered": registered,
+                    "role": format_roles(roles),
+                    "roles": list(roles),
+                    "balances": {
+                        "qubic_bal": qubic_bal_raw,
+                        "qubic_bal_capped": min(max(0, qubic_bal_raw), int(settings.qubic_cap)),
+                        "qearn_bal": int(cached["qearn_bal"] or 0),
+                        "portal_bal": int(cached["portal_bal"] or 0),
+                        "qxmr_bal": int(cached["qxmr_bal"] or 0),
+                        "qubic_cap": int(settings.qubic_cap),
+                    },
+                    "airdrop": {
+                        "estimated": int(cached["airdrop_amt"] or 0),
+                    },
+                }
+    return None
+
+
+def _store_snapshot(
+    wallet: str,
+    settings: Settings,
+    roles_csv: str,
+    *,
+    qubic_bal: int,
+    qearn_bal: int,
+    portal_bal: int,
+    qxmr_bal: int,
+) -> tuple[bool, dict[str, int], int]:
+    """Persist the fresh balances/role for `wallet`; returns (registered, breakdown, estimate)."""
+    with conn_ctx() as conn:
+        changed = ensure_user(conn, wallet, settings)
+        registered = is_registered(conn, wallet)
+
+        changed |= set_user_role(conn, wallet, roles_csv)
+        changed |= upsert_res_snapshot(
+            conn,
+            wallet,
+            qubic_bal=qubic_bal,
+            qearn_bal=qearn_bal,
+            portal_bal=portal_bal,
+            qxmr_bal=qxmr_bal,
+        )
+
+        breakdown = airdrop_breakdown_for_wallet(conn, wallet, settings, registered=registered)
+        est = int(sum(breakdown.values()))
+        changed |= update_airdrop_amount(conn, wallet, est)
+
+        if changed:
+            conn.commit()
+    return registered, breakdown, est
+
+
 @router.get("/v1/wallet/{wallet_id}/summary")
 async def wallet_summary(wallet_id: str, fresh: bool = False):
     """Public: returns ONLY the requested wallet's status.
@@ -62,97 +149,39 @@ async def wallet_summary(wallet_id: str, fresh: bool = False):
     settings = get_settings()
     wallet = normalize_identity(wallet_id)
 
-    with conn_ctx() as conn:
-        # Serve a fresh-enough cached snapshot to avoid slow RPC for typical requests, unless caller forces fresh.
-        if not fresh:
-            cached = conn.execute(
-                """
-                SELECT u.access_info,
-                       u.role,
-                       r.qubic_bal,
-                       r.qearn_bal,
-                       r.portal_bal,
-                       r.qxmr_bal,
-                       r.airdrop_amt,
-                       r.updated_at
-                FROM users u
-                LEFT JOIN res r ON r.wallet_id = u.wallet_id
-                WHERE u.wallet_id = ?
-                """,
-                (wallet,),
-            ).fetchone()
-            if cached and cached["updated_at"]:
-                try:
-                    updated_at = datetime.fromisoformat(str(cached["updated_at"])).replace(tzinfo=None)
-                    age = (datetime.utcnow() - updated_at).total_seconds()
-                except Exception:
-                    age = CACHE_TTL_SECONDS + 1
-                if age <= CACHE_TTL_SECONDS:
-                    registered = bool(cached["access_info"] == 1)
-                    roles = parse_roles(cached["role"])
-                    qubic_bal_raw = int(cached["qubic_bal"] or 0)
-                    return {
-                        "wallet_id": wallet,
-                        "registered": registered,
-                        "role": format_roles(roles),
-                        "roles": list(roles),
-                        "balances": {
-                            "qubic_bal": qubic_bal_raw,
-                            "qubic_bal_capped": min(max(0, qubic_bal_raw), int(settings.qubic_cap)),
-                            "qearn_bal": int(cached["qearn_bal"] or 0),
-                            "portal_bal": int(cached["portal_bal"] or 0),
-                            "qxmr_bal": int(cached["qxmr_bal"] or 0),
-                            "qubic_cap": int(settings.qubic_cap),
-                        },
-                        "airdrop": {
-                            "estimated": int(cached["airdrop_amt"] or 0),
-                        },
-                    }
+    if not fresh:
+        # Serve a fresh-enough cached snapshot unless the caller forces fresh; SQLite runs off the event loop.
+        cached = await asyncio.to_thread(_cached_summary, wallet, settings)
+        if cached is not None:
+            return cached
 
     rpc = QubicRpcClient(settings)
+    if fresh:
+        # the caller expects holdings that just changed (e.g. right after a purchase)
+        QubicRpcClient.invalidate(wallet)
 
-    async def _safe_call(coro, default: int = 0) -> int:
-        try:
-            return await coro
-        except Exception:
-            return default
-
-    # Fetch balances concurrently to reduce latency
-    qubic_task = asyncio.create_task(_safe_call(rpc.get_balance(wallet)))
-    qearn_task = asyncio.create_task(_safe_call(fetch_qearn_amount(rpc, wallet)))
-    portal_task = asyncio.create_task(_safe_call(fetch_portal_amount(rpc, wallet)))
-    qxmr_task = asyncio.create_task(_safe_call(fetch_qxmr_amount(rpc, wallet, issuer_id=settings.qxmr_issuer_id or None)))
-
-    qubic_bal_raw, qearn_bal, portal_bal, qxmr_bal = await asyncio.gather(
-        qubic_task, qearn_task, portal_task, qxmr_task
-    )
+    # one balance call and one owned-assets call, issued concurrently
+    bundle = await fetch_balance_bundle(rpc, wallet, qxmr_issuer_id=settings.qxmr_issuer_id or None)
+    qubic_bal_raw = bundle["qubic_bal"]
+    qearn_bal = bundle["qearn_bal"]
+    portal_bal = bundle["portal_bal"]
+    qxmr_bal = bundle["qxmr_bal"]
 
     qubic_bal_raw = int(max(0, int(qubic_bal_raw)))
     qubic_bal_capped = int(min(qubic_bal_raw, int(settings.qubic_cap)))
     roles = resolve_roles(wallet_id=wallet, settings=settings, portal_bal=int(portal_bal))
     roles_csv = format_roles(roles)
 
-    with conn_ctx() as conn:
-        changed = ensure_user(conn, wallet, settings)
-        u = conn.execute("SELECT access_info FROM users WHERE wallet_id = ?", (wallet,)).fetchone()
-        registered = bool(u and int(u[0] or 0) == 1)
-
-        changed |= set_user_role(conn, wallet, roles_csv)
-        changed |= upsert_res_snapshot(
-            conn,
-            wallet,
-            qubic_bal=qubic_bal_raw,
-            qearn_bal=int(qearn_bal),
-            portal_bal=int(portal_bal),
-            qxmr_bal=int(qxmr_bal),
-        )
-
-        breakdown = airdrop_breakdown_for_wallet(conn, wallet, settings) if registered else {"community": 0, "portal": 0, "power": 0}
-        est = int(sum(breakdown.values())) if registered else 0
-        changed |= update_airdrop_amount(conn, wallet, est)
-
-        if changed:
-            conn.commit()
+    registered, breakdown, est = await asyncio.to_thread(
+        _store_snapshot,
+        wallet,
+        settings,
+        roles_csv,
+        qubic_bal=qubic_bal_raw,
+        qearn_bal=int(qearn_bal),
+        portal_bal=int(portal_bal),
+        qxmr_bal=int(qxmr_bal),
+    )
 
     return {
         "wallet_id": wallet,
@@ -171,10 +200,40 @@ async def wallet_summary(wallet_id: str, fresh: bool = False):
     }
 
 
+def _record_registration(wallet: str, tx_id: str, amount: int, settings: Settings) -> None:
+    """Mark `wallet` registered and log the fee tx; 409 if it already is."""
+    with conn_ctx() as conn:
+        # take the write lock up front: the registered check below must not race another confirm
+        conn.execute("BEGIN IMMEDIATE")
+        ensure_user(conn, wallet, settings)
+
+        # mark registered; RETURNING yields no row when it already was
+        marked = conn.execute(
+            """
+            UPDATE users SET access_info = 1, updated_at = datetime('now')
+            WHERE wallet_id = ? AND access_info <> 1
+            RETURNING 1
+            """,
+            (wallet,),
+        ).fetchone()
+        if marked is None:
+            raise HTTPException(status_code=409, detail="wallet already registered")
+
+        # log tx
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO transaction_log(wallet_id, "from", "to", txId, type, amount)
+            VALUES(?, ?, ?, ?, 'qubic', ?)
+            """,
+            (wallet, wallet, settings.registration_address, tx_id, amount),
+        )
+        conn.commit()
+
+
 @router.post("/v1/registration/confirm")
 async def confirm_registration(req: ConfirmTxRequest):
     settings = get_settings()
-    wallet = normalize_identity(req.walletId)
+    wallet = req.walletId  # validated and upper-cased by the WalletId field type
     if wallet == settings.admin_wallet_id:
         raise HTTPException(status_code=400, detail="admin wallet cannot register")
     tx_id = req.txId.strip()
@@ -201,36 +260,44 @@ async def confirm_registration(req: ConfirmTxRequest):
             detail=f"registration requires exactly {settings.registration_amount_qu} QU",
         )
 
+    await asyncio.to_thread(_record_registration, wallet, tx_id, int(tx.amount), settings)
+
+    return {"success": True}
+
+
+def _record_tradein(wallet: str, tx_id: str, shares: int, qdoge_amount: int, tick: int, settings: Settings) -> None:
+    """Store the trade-in and its transaction_log row; 400 if the trade-in pool would overflow."""
     with conn_ctx() as conn:
+        # take the write lock up front: the pool check below must not race another trade-in
+        conn.execute("BEGIN IMMEDIATE")
         ensure_user(conn, wallet, settings)
-        u = conn.execute("SELECT access_info FROM users WHERE wallet_id = ?", (wallet,)).fetchone()
-        if u is not None and int(u[0] or 0) == 1:
-            raise HTTPException(status_code=409, detail="wallet already registered")
 
-        # mark registered
+        total_tradein = conn.execute("SELECT COALESCE(SUM(qdoge_amount),0) FROM tradeins").fetchone()[0]
+        total_tradein = int(total_tradein or 0)
+        if total_tradein + qdoge_amount > settings.tradein_pool:
+            raise HTTPException(status_code=400, detail="trade-in pool exhausted")
+
         conn.execute(
-            "UPDATE users SET access_info = 1, updated_at = datetime('now') WHERE wallet_id = ?",
-            (wallet,),
+            "INSERT OR IGNORE INTO tradeins(tx_id, wallet_id, qxmr_amount, qdoge_amount, tick) VALUES (?, ?, ?, ?, ?)",
+            (tx_id, wallet, shares, qdoge_amount, tick),
         )
 
-        # log tx
+        # also log into transaction_log (type=qxmr)
         conn.execute(
             """
             INSERT OR IGNORE INTO transaction_log(wallet_id, "from", "to", txId, type, amount)
-            VALUES(?, ?, ?, ?, 'qubic', ?)
+            VALUES(?, ?, ?, ?, 'qxmr', ?)
             """,
-            (wallet, wallet, settings.registration_address, tx_id, int(tx.amount)),
+            (wallet, wallet, settings.burn_address, tx_id, shares),
         )
         conn.commit()
 
-    return {"success": True}
-
 
 @router.post("/v1/tradein/confirm")
 async def confirm_tradein(req: ConfirmTxRequest):
     """Trade-in endpoint (implementation preserved)."""
     settings = get_settings()
-    wallet = normalize_identity(req.walletId)
+    wallet = req.walletId  # validated and upper-cased by the WalletId field type
     if wallet == settings.admin_wallet_id:
         raise HTTPException(status_code=400, detail="admin wallet cannot trade-in")
     tx_id = req.txId.strip()
@@ -287,28 +354,10 @@ async def confirm_tradein(req: ConfirmTxRequest):
 
     qdoge_amount = shares // int(settings.tradein_ratio_qdoge_per_qxmr)
 
-    with conn_ctx() as conn:
-        ensure_user(conn, wallet, settings)
-
-        total_tradein = conn.execute("SELECT COALESCE(SUM(qdoge_amount),0) FROM tradeins").fetchone()[0]
-        total_tradein = int(total_tradein or 0)
-        if total_tradein + qdoge_amount > settings.tradein_pool:
-            raise HTTPException(status_code=400, detail="trade-in pool exhausted")
-
-        conn.execute(
-            "INSERT OR IGNORE INTO tradeins(tx_id, wallet_id, qxmr_amount, qdoge_amount, tick) VALUES (?, ?, ?, ?, ?)",
-            (tx_id, wallet, shares, qdoge_amount, int(tx.tick_number)),
-        )
+    await asyncio.to_thread(_record_tradein, wallet, tx_id, shares, qdoge_amount, int(tx.tick_number), settings)
 
-        # also log into transaction_log (type=qxmr)
-        conn.execute(
-            """
-            INSERT OR IGNORE INTO transaction_log(wallet_id, "from", "to", txId, type, amount)
-            VALUES(?, ?, ?, ?, 'qxmr', ?)
-            """,
-            (wallet, wallet, settings.burn_address, tx_id, int(shares)),
-        )
-        conn.commit()
+    # QXMR holdings just changed; don't serve the pre-trade-in owned-assets list
+    QubicRpcClient.invalidate(wallet)
 
     return {"success": True, "qxmr_amount": shares, "qdoge_amount": qdoge_amount}
 
@@ -316,9 +365,10 @@ async def confirm_tradein(req: ConfirmTxRequest):
 @router.post("/v1/transaction/log", dependencies=[Depends(require_admin)])
 def log_transaction(req: TxLogRequest):
     """Admin-only transaction logger (used by admin QDOGE send UI)."""
-    wallet_id = normalize_identity(req.wallet_id)
-    from_id = normalize_identity(req.from_id)
-    to_id = normalize_identity(req.to_id)
+    # identities are validated and upper-cased by the WalletId field type
+    wallet_id = req.wallet_id
+    from_id = req.from_id
+    to_id = req.to_id
     tx_id = req.txId.strip()
     if not tx_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="txId required")
@@ -70,6 +70,13 @@ def _env_float(name: str, default: float) -> float:
         return default
 
 
+def _env_bool(name: str, default: bool) -> bool:
+    raw = _env_str(name, "").lower()
+    if not raw:
+        return default
+    return raw in {"1", "true", "yes", "on"}
+
+
 def _env_csv(name: str, default: str = "") -> list[str]:
     raw = os.getenv(name)
     if raw is None or raw.strip() == "":
@@ -113,11 +120,17 @@ class Settings:
     admin_wallet_id: str = ""
 
     # --- role config ---
-    power_users: set[str] = field(default_factory=set)
+    power_users: frozenset[str] = field(default_factory=frozenset)
 
     # --- storage ---
     db_path: str = "schema/airdrop.db"
 
+    # --- rpc cache (seconds; <= 0 disables) ---
+    rpc_tick_ttl_seconds: float = 2.0
+    rpc_owned_assets_ttl_seconds: float = 15.0
+    # trust the assets API to return one entry per asset (first match wins, scan stops early)
+    strict_asset_uniqueness: bool = False
+
     # ---- derived allocations (QDOGE units) ----
     @property
     def community_pool(self) -> int:
@@ -228,6 +241,10 @@ def get_settings() -> Settings:
 
     db_path = _env_str("DB_PATH", "schema/airdrop.db")
 
+    rpc_tick_ttl_seconds = _env_float("RPC_TICK_TTL_SECONDS", 2.0)
+    rpc_owned_assets_ttl_seconds = _env_float("RPC_OWNED_ASSETS_TTL_SECONDS", 15.0)
+    strict_asset_uniqueness = _env_bool("STRICT_ASSET_UNIQUENESS", False)
+
     return Settings(
         total_supply_qdoge=total_supply_qdoge,
         community_pct=community_pct,
@@ -250,6 +267,9 @@ def get_settings() -> Settings:
         cors_allow_origins=cors_allow_origins,
         admin_api_key=admin_api_key,
         admin_wallet_id=admin_wallet_id,
-        power_users=power_users,
+        power_users=frozenset(power_users),
         db_path=db_path,
+        rpc_tick_ttl_seconds=rpc_tick_ttl_seconds,
+        rpc_owned_assets_ttl_seconds=rpc_owned_assets_ttl_seconds,
+        strict_asset_uniqueness=strict_asset_uniqueness,
     )
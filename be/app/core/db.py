@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import os
+import queue
 import sqlite3
 from contextlib import contextmanager
 from pathlib import Path
@@ -18,22 +20,175 @@ def _get_db_path() -> Path:
     return path
 
 
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(_get_db_path(), check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
-    conn.execute("PRAGMA journal_mode = WAL;")
-    conn.execute("PRAGMA synchronous = NORMAL;")
+# Per-connection settings, applied once when a connection is opened. journal_mode is
+# not here: WAL is persistent in the database file and init_db switches it once.
+_CONN_PRAGMAS = """
+PRAGMA busy_timeout = 5000;
+PRAGMA foreign_keys = ON;
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -65536;
+PRAGMA mmap_size = 268435456;
+"""  # cache: up to 64 MiB of pages; mmap: 256 MiB memory-mapped reads
+
+
+def get_conn(*, readonly: bool = False) -> sqlite3.Connection:
+    # pooled connections live across requests, so their compiled-statement cache does too;
+    # 256 slots comfortably hold every distinct SQL string the app issues
+    # rows are plain tuples; callers that want named access set sqlite3.Row on their cursor
+    if readonly:
+        # opened read-only at the OS level; the file must already exist (init_db creates it)
+        uri = f"{_get_db_path().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=256)
+    else:
+        # implicit transactions (before INSERT/UPDATE/DELETE) start as BEGIN IMMEDIATE
+        uri = f"{_get_db_path().as_uri()}?mode=rwc"
+        conn = sqlite3.connect(
+            uri, uri=True, check_same_thread=False, cached_statements=256, isolation_level="IMMEDIATE"
+        )
+    conn.executescript(_CONN_PRAGMAS)
     return conn
 
 
+# Idle connections kept open between requests so the per-connection pragmas and the
+# SQLite page cache survive; extra connections are opened on demand and closed on release.
+# LIFO hands out the most recently used (warmest) connection first.
+# Readers get their own read-only pool: under WAL they never wait on the writer, and a
+# read path can never leave a write lock or open write transaction behind.
+_POOL_SIZE = min((os.cpu_count() or 1) * 2, 16)
+_POOL: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=_POOL_SIZE)
+_READ_POOL: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=_POOL_SIZE)
+
+
+def _release(pool: "queue.LifoQueue[sqlite3.Connection]", conn: sqlite3.Connection) -> None:
+    try:
+        if conn.in_transaction:
+            conn.rollback()  # match close(): uncommitted work is discarded
+    except sqlite3.Error:
+        conn.close()
+        return
+    try:
+        pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def close_pool() -> None:
+    """Close every idle pooled connection (call once on app shutdown)."""
+    for pool in (_POOL, _READ_POOL):
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
 @contextmanager
 def conn_ctx() -> Iterator[sqlite3.Connection]:
-    conn = get_conn()
+    """Read-write connection; use for any path that may write."""
+    try:
+        conn = _POOL.get_nowait()
+    except queue.Empty:
+        conn = get_conn()
     try:
         yield conn
     finally:
-        conn.close()
+        _release(_POOL, conn)
+
+
+@contextmanager
+def read_conn_ctx() -> Iterator[sqlite3.Connection]:
+    """Read-only (mode=ro) connection from the reader pool."""
+    try:
+        conn = _READ_POOL.get_nowait()
+    except queue.Empty:
+        conn = get_conn(readonly=True)
+    try:
+        yield conn
+    finally:
+        _release(_READ_POOL, conn)
+
+
+# wallet_id is stored in canonical uppercase (see _fold_wallet_ids); tables created from
+# these definitions enforce it with a CHECK. Existing tables are not rebuilt to add it:
+# every writer already normalizes, and v5/v7 fold the legacy rows.
+_DDL_USERS = """
+CREATE TABLE IF NOT EXISTS users (
+  wallet_id TEXT PRIMARY KEY,
+  role TEXT NOT NULL DEFAULT 'community',
+  access_info INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+  CHECK (access_info IN (0,1)),
+  CHECK (wallet_id = UPPER(wallet_id))
+);
+"""
+
+_DDL_RES = """
+CREATE TABLE IF NOT EXISTS res (
+  wallet_id TEXT PRIMARY KEY,
+  qubic_bal INTEGER NOT NULL DEFAULT 0,
+  qearn_bal INTEGER NOT NULL DEFAULT 0,
+  portal_bal INTEGER NOT NULL DEFAULT 0,
+  qxmr_bal INTEGER NOT NULL DEFAULT 0,
+  airdrop_amt INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+  FOREIGN KEY(wallet_id) REFERENCES users(wallet_id) ON DELETE CASCADE,
+  CHECK (wallet_id = UPPER(wallet_id))
+);
+"""
+
+# Append-only, so a plain rowid key hands out the same increasing ids without
+# AUTOINCREMENT's sqlite_sequence update on every insert.
+_DDL_TRANSACTION_LOG = """
+CREATE TABLE IF NOT EXISTS transaction_log (
+  no INTEGER PRIMARY KEY,
+  wallet_id TEXT NOT NULL,
+  "from" TEXT NOT NULL,
+  "to" TEXT NOT NULL,
+  txId TEXT NOT NULL UNIQUE,
+  type TEXT NOT NULL,
+  amount INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+  CHECK (wallet_id = UPPER(wallet_id))
+);
+"""
+
+_DDL_TRADEINS = """
+CREATE TABLE IF NOT EXISTS tradeins (
+  tx_id TEXT PRIMARY KEY,
+  wallet_id TEXT NOT NULL,
+  qxmr_amount INTEGER NOT NULL,
+  qdoge_amount INTEGER NOT NULL,
+  tick INTEGER NOT NULL,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  FOREIGN KEY(wallet_id) REFERENCES users(wallet_id) ON DELETE CASCADE,
+  CHECK (wallet_id = UPPER(wallet_id))
+);
+"""
+
+_SCHEMA_VERSION = 7
+
+# Latest schema for an empty database, applied as one script in one transaction.
+# executescript() commits any pending transaction and then runs in autocommit mode,
+# so the script carries its own BEGIN/COMMIT; user_version is set inside it.
+_SCHEMA_LATEST = f"""
+BEGIN IMMEDIATE;
+{_DDL_USERS}
+CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+CREATE INDEX IF NOT EXISTS idx_users_access_wallet ON users(access_info, wallet_id);
+{_DDL_RES}
+{_DDL_TRANSACTION_LOG}
+CREATE INDEX IF NOT EXISTS idx_tx_wallet ON transaction_log(wallet_id);
+CREATE INDEX IF NOT EXISTS idx_tx_type ON transaction_log(type);
+{_DDL_TRADEINS}
+CREATE INDEX IF NOT EXISTS idx_tradein_wallet ON tradeins(wallet_id);
+CREATE INDEX IF NOT EXISTS idx_tradein_qdoge ON tradeins(qdoge_amount);
+PRAGMA user_version = {_SCHEMA_VERSION};
+COMMIT;
+"""
 
 
 def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
@@ -55,19 +210,39 @@ def init_db() -> None:
 
     Trade-in table is preserved as-is to avoid changing its implementation.
     """
+    # Steady state (every restart): two reads on a read-only connection, no write transaction.
+    # A missing database file is created by the writer below.
+    if _get_db_path().exists():
+        with read_conn_ctx() as conn:
+            wal = conn.execute("PRAGMA journal_mode;").fetchone()[0].lower() == "wal"
+            if wal and int(conn.execute("PRAGMA user_version;").fetchone()[0] or 0) >= _SCHEMA_VERSION:
+                return
+
     with conn_ctx() as conn:
+        # persistent in the database file, so this only ever writes once per database
+        if conn.execute("PRAGMA journal_mode;").fetchone()[0].lower() != "wal":
+            conn.execute("PRAGMA journal_mode = WAL;")
         current = int(conn.execute("PRAGMA user_version;").fetchone()[0] or 0)
 
-        # Fresh install: create v3 schema directly.
-        if current == 0:
-            _migration_3(conn)
-            conn.execute("PRAGMA user_version = 3;")
+        # Fresh install: create the latest schema directly. An unversioned database that
+        # already has tables is a legacy one and goes through the migrations below.
+        if current == 0 and conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is None:
+            conn.executescript(_SCHEMA_LATEST)
             return
 
-        # Upgrade from any older schema to v3.
-        if current < 3:
-            _migration_3(conn)
-            conn.execute("PRAGMA user_version = 3;")
+        # One transaction per step: the migration body and its version bump commit
+        # together. The version is re-read under the write lock so that concurrent
+        # boots apply each step exactly once.
+        for version, migrate in _MIGRATIONS:
+            if current >= version:
+                continue
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                current = int(conn.execute("PRAGMA user_version;").fetchone()[0] or 0)
+                if current < version:
+                    migrate(conn)
+                    conn.execute(f"PRAGMA user_version = {version};")
+                    current = version
 
 
 def _migration_3(conn: sqlite3.Connection) -> None:
@@ -78,115 +253,140 @@ def _migration_3(conn: sqlite3.Connection) -> None:
     - Rebuilds transaction_log to match spec and migrates legacy rows
     - Removes deprecated tables not used anymore
     """
-    with conn:
-        # ---- USERS ----
-        if not _table_exists(conn, "users"):
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS users (
-                  wallet_id TEXT PRIMARY KEY,
-                  role TEXT NOT NULL DEFAULT 'community',
-                  access_info INTEGER NOT NULL DEFAULT 0,
-                  created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                  updated_at TEXT NOT NULL DEFAULT (datetime('now')),
-                  CHECK (access_info IN (0,1))
-                );
-                """
-            )
+    # ---- USERS ----
+    if not _table_exists(conn, "users"):
+        conn.execute(_DDL_USERS)
+    else:
+        # add role column if missing
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(users);").fetchall()}
+        if "role" not in cols:
+            conn.execute("ALTER TABLE users ADD COLUMN role TEXT NOT NULL DEFAULT 'community';")
+        if "access_info" not in cols:
+            conn.execute("ALTER TABLE users ADD COLUMN access_info INTEGER NOT NULL DEFAULT 0;")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);")
+
+    # ---- RES ----
+    conn.execute(_DDL_RES)
+
+    # ---- TRANSACTION LOG ----
+    if _table_exists(conn, "transaction_log"):
+        cols = [r[1] for r in conn.execute("PRAGMA table_info(transaction_log);").fetchall()]
+        legacy = set(cols) >= {"sender", "recipient", "tx_hash"}
+        if legacy:
+            # rename legacy table
+            conn.execute("ALTER TABLE transaction_log RENAME TO transaction_log_legacy;")
         else:
-            # add role column if missing
-            cols = {r[1] for r in conn.execute("PRAGMA table_info(users);").fetchall()}
-            if "role" not in cols:
-                conn.execute("ALTER TABLE users ADD COLUMN role TEXT NOT NULL DEFAULT 'community';")
-            if "access_info" not in cols:
-                conn.execute("ALTER TABLE users ADD COLUMN access_info INTEGER NOT NULL DEFAULT 0;")
+            # already new schema-ish; keep
+            legacy = False
 
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);")
+    conn.execute(_DDL_TRANSACTION_LOG)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_wallet ON transaction_log(wallet_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_type ON transaction_log(type);")
 
-        # ---- RES ----
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS res (
-              wallet_id TEXT PRIMARY KEY,
-              qubic_bal INTEGER NOT NULL DEFAULT 0,
-              qearn_bal INTEGER NOT NULL DEFAULT 0,
-              portal_bal INTEGER NOT NULL DEFAULT 0,
-              qxmr_bal INTEGER NOT NULL DEFAULT 0,
-              airdrop_amt INTEGER NOT NULL DEFAULT 0,
-              created_at TEXT NOT NULL DEFAULT (datetime('now')),
-              updated_at TEXT NOT NULL DEFAULT (datetime('now')),
-              FOREIGN KEY(wallet_id) REFERENCES users(wallet_id) ON DELETE CASCADE
-            );
+    # migrate legacy transaction_log rows if present
+    if _table_exists(conn, "transaction_log_legacy"):
+        legacy_rows = conn.execute(
+            "SELECT sender, recipient, tx_hash, created_at, updated_at FROM transaction_log_legacy"
+        ).fetchall()
+        rows = []
+        for r in legacy_rows:
+            sender = str(r[0] or "").upper()
+            recipient = str(r[1] or "").upper()
+            tx_hash = str(r[2] or "")
+            if not tx_hash:
+                continue
+            rows.append((sender, sender, recipient, tx_hash, r[3], r[4]))
+        conn.executemany(
             """
+            INSERT OR IGNORE INTO transaction_log(wallet_id, "from", "to", txId, type, amount, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'qubic', 0, COALESCE(?, datetime('now')), COALESCE(?, datetime('now')))
+            """,
+            rows,
         )
+        conn.execute("DROP TABLE transaction_log_legacy;")
 
-        # ---- TRANSACTION LOG ----
-        if _table_exists(conn, "transaction_log"):
-            cols = [r[1] for r in conn.execute("PRAGMA table_info(transaction_log);").fetchall()]
-            legacy = set(cols) >= {"sender", "recipient", "tx_hash"}
-            if legacy:
-                # rename legacy table
-                conn.execute("ALTER TABLE transaction_log RENAME TO transaction_log_legacy;")
-            else:
-                # already new schema-ish; keep
-                legacy = False
-
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS transaction_log (
-              no INTEGER PRIMARY KEY AUTOINCREMENT,
-              wallet_id TEXT NOT NULL,
-              "from" TEXT NOT NULL,
-              "to" TEXT NOT NULL,
-              txId TEXT NOT NULL UNIQUE,
-              type TEXT NOT NULL,
-              amount INTEGER NOT NULL DEFAULT 0,
-              created_at TEXT NOT NULL DEFAULT (datetime('now')),
-              updated_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-            """
-        )
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_wallet ON transaction_log(wallet_id);")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_type ON transaction_log(type);")
-
-        # migrate legacy transaction_log rows if present
-        if _table_exists(conn, "transaction_log_legacy"):
-            legacy_rows = conn.execute(
-                "SELECT sender, recipient, tx_hash, created_at, updated_at FROM transaction_log_legacy"
-            ).fetchall()
-            for r in legacy_rows:
-                sender = str(r[0] or "").upper()
-                recipient = str(r[1] or "").upper()
-                tx_hash = str(r[2] or "")
-                if not tx_hash:
-                    continue
-                conn.execute(
-                    """
-                    INSERT OR IGNORE INTO transaction_log(wallet_id, "from", "to", txId, type, amount, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, 'qubic', 0, COALESCE(?, datetime('now')), COALESCE(?, datetime('now')))
-                    """,
-                    (sender, sender, recipient, tx_hash, r[3], r[4]),
-                )
-            conn.execute("DROP TABLE transaction_log_legacy;")
-
-        # ---- KEEP tradeins for trade-in implementation ----
-        if not _table_exists(conn, "tradeins"):
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS tradeins (
-                  tx_id TEXT PRIMARY KEY,
-                  wallet_id TEXT NOT NULL,
-                  qxmr_amount INTEGER NOT NULL,
-                  qdoge_amount INTEGER NOT NULL,
-                  tick INTEGER NOT NULL,
-                  created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                  FOREIGN KEY(wallet_id) REFERENCES users(wallet_id) ON DELETE CASCADE
-                );
-                """
-            )
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_tradein_wallet ON tradeins(wallet_id);")
-
-        # ---- Drop deprecated tables (no longer used) ----
-        for tbl in ("registrations", "fundings", "qearn_snapshot", "portal_snapshot", "power_snapshot"):
-            if _table_exists(conn, tbl):
-                conn.execute(f"DROP TABLE {tbl};")
+    # ---- KEEP tradeins for trade-in implementation ----
+    if not _table_exists(conn, "tradeins"):
+        conn.execute(_DDL_TRADEINS)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tradein_wallet ON tradeins(wallet_id);")
+
+    # ---- Drop deprecated tables (no longer used) ----
+    for tbl in ("registrations", "fundings", "qearn_snapshot", "portal_snapshot", "power_snapshot"):
+        if _table_exists(conn, tbl):
+            conn.execute(f"DROP TABLE {tbl};")
+
+
+def _migration_4(conn: sqlite3.Connection) -> None:
+    """Schema v4: covering index for the registered-wallet snapshot scan.
+
+    Lets `WHERE access_info = 1 ORDER BY wallet_id` run as an index range scan
+    (no temp b-tree sort); res is joined on its wallet_id primary key.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_access_wallet ON users(access_info, wallet_id);")
+
+
+def _fold_wallet_ids(conn: sqlite3.Connection) -> None:
+    """Rewrite every stored wallet_id to canonical uppercase, merging case duplicates.
+
+    When both `aaa...` and `AAA...` exist, the canonical (uppercase) users/res row is kept,
+    child tradeins/transaction_log rows move onto it, and the duplicate is deleted. A
+    registration (access_info = 1) on a duplicate carries over to the canonical user.
+    """
+    # res/tradeins reference users(wallet_id); check FKs at commit, after all tables moved
+    conn.execute("PRAGMA defer_foreign_keys = ON;")
+    # no uniqueness on wallet_id here, so every row can be renamed in place
+    for table in ("tradeins", "transaction_log"):
+        conn.execute(f"UPDATE {table} SET wallet_id = UPPER(wallet_id) WHERE wallet_id <> UPPER(wallet_id);")
+    conn.execute(
+        """
+        UPDATE users SET access_info = 1
+        WHERE access_info <> 1 AND wallet_id = UPPER(wallet_id)
+          AND EXISTS (
+            SELECT 1 FROM users d
+            WHERE d.wallet_id <> users.wallet_id AND UPPER(d.wallet_id) = users.wallet_id AND d.access_info = 1
+          )
+        """
+    )
+    # children first: deleting a duplicate user cascades to whatever still points at it
+    for table in ("res", "users"):
+        conn.execute(f"UPDATE OR IGNORE {table} SET wallet_id = UPPER(wallet_id) WHERE wallet_id <> UPPER(wallet_id);")
+        # anything still mixed-case collided with an existing canonical row, which wins
+        conn.execute(f"DELETE FROM {table} WHERE wallet_id <> UPPER(wallet_id);")
+
+
+def _migration_5(conn: sqlite3.Connection) -> None:
+    """Schema v5: store every wallet_id in canonical uppercase.
+
+    Writers already normalize, so this only folds legacy mixed-case rows; afterwards
+    readers can compare and return stored ids as-is.
+    """
+    _fold_wallet_ids(conn)
+
+
+def _migration_6(conn: sqlite3.Connection) -> None:
+    """Schema v6: covering index for the trade-in pool total.
+
+    The pool check sums tradeins.qdoge_amount inside every trade-in write transaction;
+    with this index the sum scans the narrow index instead of the table rows.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tradein_qdoge ON tradeins(qdoge_amount);")
+
+
+def _migration_7(conn: sqlite3.Connection) -> None:
+    """Schema v7: merge case-duplicate wallet ids that an earlier v5 left in place.
+
+    The first v5 skipped rows whose uppercase form already existed, so databases
+    migrated by it can still hold lowercase duplicates; fold them the same way.
+    """
+    _fold_wallet_ids(conn)
+
+
+# (version, step) in order; each step runs inside init_db's transaction and must not commit
+_MIGRATIONS = (
+    (3, _migration_3),
+    (4, _migration_4),
+    (5, _migration_5),
+    (6, _migration_6),
+    (7, _migration_7),
+)
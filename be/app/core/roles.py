@@ -6,6 +6,28 @@ if TYPE_CHECKING:  # pragma: no cover
     from app.core.config import Settings
 
 ROLE_ORDER: Tuple[str, ...] = ("admin", "power", "portal", "community")
+_ROLE_ORDER_SET = frozenset(ROLE_ORDER)
+
+# Role membership as bit flags, for hot loops that only need `mask & ROLE_X` checks.
+ROLE_COMMUNITY = 1
+ROLE_PORTAL = 2
+ROLE_POWER = 4
+ROLE_ADMIN = 8
+
+# Non-admin masks are always community plus optional portal/power, so the normalized
+# tuples are precomputed and indexed by the portal/power bits.
+_ADMIN_ROLES: tuple[str, ...] = ("admin",)
+_ROLE_TUPLES: Tuple[tuple[str, ...], ...] = (
+    ("community",),
+    ("portal", "community"),
+    ("power", "community"),
+    ("power", "portal", "community"),
+)
+
+# Every role set the backend writes is one of the tuples above, so users.role almost
+# always holds one of these exact strings; map both directions without re-normalizing.
+_CANONICAL_CSV: dict[tuple[str, ...], str] = {t: ",".join(t) for t in (_ADMIN_ROLES, *_ROLE_TUPLES)}
+_CANONICAL_ROLES: dict[str, tuple[str, ...]] = {csv: t for t, csv in _CANONICAL_CSV.items()}
 
 
 def normalize_roles(raw_roles: Iterable[str] | None) -> tuple[str, ...]:
@@ -16,15 +38,22 @@ def normalize_roles(raw_roles: Iterable[str] | None) -> tuple[str, ...]:
         if not value or value in seen:
             continue
         seen.append(value)
+    if not seen:
+        return ("community",)
     if "admin" in seen:
         return ("admin",)
+    if len(seen) == 1:
+        # common case (e.g. community-only): nothing to order
+        return (seen[0],)
     ordered = tuple(r for r in ROLE_ORDER if r in seen)
-    extras = tuple(sorted(r for r in seen if r not in ROLE_ORDER))
-    out = ordered + extras
-    return out if out else ("community",)
+    extras = tuple(sorted(r for r in seen if r not in _ROLE_ORDER_SET))
+    return ordered + extras
 
 
 def parse_roles(value: str | None) -> tuple[str, ...]:
+    canonical = _CANONICAL_ROLES.get(value) if isinstance(value, str) else None
+    if canonical is not None:
+        return canonical
     if value is None or str(value).strip() == "":
         return ("community",)
     parts = (part.strip() for part in str(value).split(","))
@@ -32,17 +61,30 @@ def parse_roles(value: str | None) -> tuple[str, ...]:
 
 
 def format_roles(roles: Iterable[str] | None) -> str:
+    canonical = _CANONICAL_CSV.get(roles) if isinstance(roles, tuple) else None
+    if canonical is not None:
+        return canonical
     return ",".join(normalize_roles(roles))
 
 
-def resolve_roles(*, wallet_id: str, settings: "Settings", portal_bal: int) -> tuple[str, ...]:
-    """Resolve a wallet role set based on balances and static config."""
-    if getattr(settings, "admin_wallet_id", "") and wallet_id == settings.admin_wallet_id:
-        return ("admin",)
-    roles: list[str] = ["community"]
+def resolve_role_mask(*, wallet_id: str, settings: "Settings", portal_bal: int) -> int:
+    """Resolve a wallet's roles as ROLE_* bit flags (see resolve_roles)."""
+    if settings.admin_wallet_id and wallet_id == settings.admin_wallet_id:
+        return ROLE_ADMIN
+    mask = ROLE_COMMUNITY
     if int(portal_bal) > 0:
-        roles.append("portal")
+        mask |= ROLE_PORTAL
     if wallet_id in settings.power_users:
-        roles.append("power")
-    return normalize_roles(roles)
+        mask |= ROLE_POWER
+    return mask
+
+
+def roles_from_mask(mask: int) -> tuple[str, ...]:
+    if mask & ROLE_ADMIN:
+        return _ADMIN_ROLES
+    return _ROLE_TUPLES[(mask >> 1) & 3]
 
+
+def resolve_roles(*, wallet_id: str, settings: "Settings", portal_bal: int) -> tuple[str, ...]:
+    """Resolve a wallet role set based on balances and static config."""
+    return roles_from_mask(resolve_role_mask(wallet_id=wallet_id, settings=settings, portal_bal=portal_bal))
@@ -1,17 +1,34 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import get_settings
-from app.core.db import init_db
+from app.core.db import close_pool, init_db
 from app.api.public import router as public_router
 from app.api.admin import router as admin_router
+from app.api.responses import ORJSONResponse
+from app.services.rpc import QubicRpcClient
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # release pooled RPC connections
+    await QubicRpcClient.aclose()
+    close_pool()
 
 
 def create_app() -> FastAPI:
     settings = get_settings()
     init_db()
 
-    app = FastAPI(title="QDOGE Airdrop API", version="3.0.0")
+    app = FastAPI(
+        title="QDOGE Airdrop API",
+        version="3.0.0",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
+    )
 
     app.add_middleware(
         CORSMiddleware,
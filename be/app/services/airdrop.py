@@ -1,57 +1,76 @@
 from __future__ import annotations
 
+import heapq
 import sqlite3
 import threading
-from dataclasses import dataclass
-from typing import Any, Dict, Iterable, Tuple
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Tuple
 
 from app.core.config import Settings, get_settings
-from app.core.roles import resolve_roles
-from app.services.storage import update_airdrop_amount
-
-
-@dataclass(frozen=True)
-class WalletSnapshot:
-    wallet_id: str
-    roles: tuple[str, ...]
-    qubic_bal: int  # raw wallet balance
-    qearn_bal: int
-    portal_bal: int
-    qxmr_bal: int
-
+from app.core.roles import ROLE_COMMUNITY, ROLE_PORTAL, ROLE_POWER, resolve_role_mask
+from app.services.storage import is_registered, replace_airdrop_amounts
+
+
+# Statements live at module level so every call hands sqlite3 the same string
+# and hits its per-connection statement cache.
+_SQL_ALLOCATION_VERSION = """
+SELECT u.cnt, u.last, r.cnt, r.last
+FROM (SELECT COUNT(*) AS cnt, COALESCE(MAX(updated_at), '') AS last FROM users WHERE access_info = 1) u,
+     (SELECT COUNT(*) AS cnt, COALESCE(MAX(updated_at), '') AS last FROM res) r
+"""
+
+# SQLite only clamps columns (NULL/negative -> 0, qubic capped). Sums and products stay
+# in Python: SQLite turns an overflowing INTEGER result into an inexact REAL, and
+# nothing bounds the RPC-sourced balances.
+_SQL_REGISTERED_SNAPSHOTS = """
+SELECT u.wallet_id,
+       MIN(MAX(COALESCE(r.qubic_bal, 0), 0), :qubic_cap) AS qubic_capped,
+       MAX(COALESCE(r.qearn_bal, 0), 0) AS qearn_bal,
+       MAX(COALESCE(r.portal_bal, 0), 0) AS portal_bal,
+       MAX(COALESCE(r.qxmr_bal, 0), 0) AS qxmr_bal
+FROM users u
+LEFT JOIN res r ON r.wallet_id = u.wallet_id
+WHERE u.access_info = 1 AND u.wallet_id <> :admin_wallet_id
+ORDER BY u.wallet_id ASC
+"""
 
 _ALLOC_CACHE_LOCK = threading.Lock()
 _ALLOC_CACHE: dict[str, Any] = {"version": None, "settings": None, "value": None}
 
 
+# (settings, signature) for the last Settings seen; get_settings() returns one
+# long-lived instance, so this is effectively computed once per process.
+_SETTINGS_SIG_MEMO: tuple[Settings | None, tuple[Any, ...]] = (None, ())
+
+
 def _settings_signature(settings: Settings) -> tuple[Any, ...]:
-    return (
+    global _SETTINGS_SIG_MEMO
+    memo_settings, memo_sig = _SETTINGS_SIG_MEMO
+    if memo_settings is settings:
+        return memo_sig
+    sig = (
         int(settings.community_pool),
         int(settings.portal_pool),
         int(settings.power_pool),
         int(settings.portal_total_supply),
         int(settings.qubic_cap),
-        tuple(sorted(settings.power_users)),
+        # frozenset compares by content, no need to sort it into a tuple
+        frozenset(settings.power_users),
     )
+    _SETTINGS_SIG_MEMO = (settings, sig)
+    return sig
 
 
 def _allocation_version(conn: sqlite3.Connection) -> tuple[Any, ...]:
-    users_meta = conn.execute(
-        "SELECT COUNT(*), COALESCE(MAX(updated_at), '') FROM users WHERE access_info = 1"
-    ).fetchone()
-    res_meta = conn.execute("SELECT COUNT(*), COALESCE(MAX(updated_at), '') FROM res").fetchone()
+    meta = conn.execute(_SQL_ALLOCATION_VERSION).fetchone()
     return (
-        int(users_meta[0] or 0),
-        str(users_meta[1] or ""),
-        int(res_meta[0] or 0),
-        str(res_meta[1] or ""),
+        int(meta[0] or 0),
+        str(meta[1] or ""),
+        int(meta[2] or 0),
+        str(meta[3] or ""),
     )
 
 
-def _clone_allocations(data: dict[str, dict[str, int]]) -> dict[str, dict[str, int]]:
-    return {role: dict(wallets) for role, wallets in data.items()}
-
-
 def _alloc_proportional(pool: int, weights: Dict[str, int]) -> Dict[str, int]:
     """Deterministic proportional integer allocation using largest remainder.
 
@@ -60,66 +79,72 @@ def _alloc_proportional(pool: int, weights: Dict[str, int]) -> Dict[str, int]:
     """
     if pool <= 0 or not weights:
         return {k: 0 for k in weights}
-    total = sum(max(0, int(w)) for w in weights.values())
+    # coerce each weight once; parallel to weights.keys()
+    values = [max(0, int(w)) for w in weights.values()]
+    total = sum(values)
     if total <= 0:
         return {k: 0 for k in weights}
 
     floors: Dict[str, int] = {}
     remainders: list[Tuple[int, str]] = []  # (remainder_numerator, wallet_id)
-    allocated = 0
-    for wallet, w in weights.items():
-        w_i = max(0, int(w))
-        prod = pool * w_i
-        fl = prod // total
-        rem = prod % total
-        floors[wallet] = int(fl)
-        allocated += int(fl)
-        remainders.append((int(rem), wallet))
-
-    remaining = pool - allocated
+    for wallet, w_i in zip(weights, values):
+        fl, rem = divmod(pool * w_i, total)
+        floors[wallet] = fl
+        remainders.append((rem, wallet))
+
+    remaining = pool - sum(floors.values())
     if remaining <= 0:
         return floors
 
-    # largest remainder, deterministic tie-break by wallet_id
-    remainders.sort(key=lambda x: (-x[0], x[1]))
-    for i in range(remaining):
-        floors[remainders[i % len(remainders)][1]] += 1
+    # largest remainder, deterministic tie-break by wallet_id; remaining < len(remainders)
+    # so only the top `remaining` entries are needed, not a full sort
+    for _, wallet in heapq.nsmallest(remaining, remainders, key=lambda x: (-x[0], x[1])):
+        floors[wallet] += 1
 
     return floors
 
 
-def _fetch_registered_snapshots(conn: sqlite3.Connection, settings: Settings) -> list[WalletSnapshot]:
-    rows = conn.execute(
-        """
-        SELECT u.wallet_id,
-               COALESCE(r.qubic_bal, 0) AS qubic_bal,
-               COALESCE(r.qearn_bal, 0) AS qearn_bal,
-               COALESCE(r.portal_bal, 0) AS portal_bal,
-               COALESCE(r.qxmr_bal, 0) AS qxmr_bal
-        FROM users u
-        LEFT JOIN res r ON r.wallet_id = u.wallet_id
-        WHERE u.access_info = 1
-        ORDER BY u.wallet_id ASC
-        """
-    ).fetchall()
-    out: list[WalletSnapshot] = []
-    for r in rows:
-        wallet_id = str(r["wallet_id"]).upper()
-        if wallet_id == settings.admin_wallet_id:
-            # admins cannot participate in airdrops
-            continue
-        portal_bal = int(r["portal_bal"] or 0)
-        out.append(
-            WalletSnapshot(
-                wallet_id=wallet_id,
-                roles=resolve_roles(wallet_id=wallet_id, settings=settings, portal_bal=portal_bal),
-                qubic_bal=int(r["qubic_bal"] or 0),
-                qearn_bal=int(r["qearn_bal"] or 0),
-                portal_bal=portal_bal,
-                qxmr_bal=int(r["qxmr_bal"] or 0),
-            )
-        )
-    return out
+def _fetch_registered_weights(
+    conn: sqlite3.Connection, settings: Settings
+) -> tuple[Dict[str, int], Dict[str, int], Dict[str, int]]:
+    """Scan registered wallets once; return (community_weights, power_weights, portal_alloc).
+
+    Roles only gate which maps a wallet lands in; categories whose pool is 0 are left empty.
+    """
+    community_on = int(settings.community_pool) > 0
+    power_on = int(settings.power_pool) > 0
+    portal_pool = max(0, int(settings.portal_pool))
+    portal_denom = max(1, int(settings.portal_total_supply))
+    portal_on = portal_pool > 0
+
+    community_weights: Dict[str, int] = {}
+    power_weights: Dict[str, int] = {}
+    portal_alloc: Dict[str, int] = {}
+
+    cur = conn.cursor()
+    # admins cannot participate in airdrops; they are filtered out in SQL
+    cur.execute(
+        _SQL_REGISTERED_SNAPSHOTS,
+        {
+            "qubic_cap": int(settings.qubic_cap),
+            "admin_wallet_id": settings.admin_wallet_id,
+        },
+    )
+    # Iterate the cursor directly so rows are stepped one at a time and folded into the
+    # maps without materializing a result list. Every numeric column is COALESCE/MAX-ed
+    # to a non-NULL int by the query.
+    # wallet ids are stored uppercase with case duplicates merged (schema v5/v7), so they are used as-is.
+    for wallet, qubic_capped, qearn_bal, portal_bal, qxmr_bal in cur:
+        mask = resolve_role_mask(wallet_id=wallet, settings=settings, portal_bal=portal_bal)
+        community_weight = qubic_capped + qearn_bal
+        if community_on and mask & ROLE_COMMUNITY and community_weight > 0:
+            community_weights[wallet] = community_weight
+        if power_on and mask & ROLE_POWER and qxmr_bal > 0:
+            power_weights[wallet] = qxmr_bal
+        if portal_on and mask & ROLE_PORTAL and portal_bal > 0:
+            # fixed denominator, floored per wallet
+            portal_alloc[wallet] = portal_pool * portal_bal // portal_denom
+    return community_weights, power_weights, portal_alloc
 
 
 def _compute_allocations_internal(conn: sqlite3.Connection, settings: Settings) -> dict[str, dict[str, int]]:
@@ -133,94 +158,120 @@ def _compute_allocations_internal(conn: sqlite3.Connection, settings: Settings)
     Note: portal pool uses the fixed denominator (portal_total_supply) per spec.
     This can leave some tokens undistributed if not all portal units are held by registered users.
     """
-    snaps = _fetch_registered_snapshots(conn, settings)
+    community_pool = int(settings.community_pool)
+    power_pool = int(settings.power_pool)
+    portal_pool = max(0, int(settings.portal_pool))
+    if community_pool <= 0 and power_pool <= 0 and portal_pool <= 0:
+        # every category is disabled; skip the snapshot scan entirely
+        return {"community": {}, "power": {}, "portal": {}}
 
-    community_weights: Dict[str, int] = {}
-    power_weights: Dict[str, int] = {}
-    portal_balances: Dict[str, int] = {}
-
-    for s in snaps:
-        if "community" in s.roles:
-            w = int(min(max(0, s.qubic_bal), settings.qubic_cap) + max(0, s.qearn_bal))
-            if w > 0:
-                community_weights[s.wallet_id] = w
-        if "power" in s.roles and s.qxmr_bal > 0:
-            power_weights[s.wallet_id] = int(s.qxmr_bal)
-        if "portal" in s.roles and s.portal_bal > 0:
-            portal_balances[s.wallet_id] = int(s.portal_bal)
-
-    community_alloc = _alloc_proportional(int(settings.community_pool), community_weights)
-    power_alloc = _alloc_proportional(int(settings.power_pool), power_weights)
-
-    # portal: fixed denominator
-    portal_alloc: Dict[str, int] = {}
-    denom = max(1, int(settings.portal_total_supply))
-    pool = max(0, int(settings.portal_pool))
-    for wallet, bal in portal_balances.items():
-        bal_i = max(0, int(bal))
-        portal_alloc[wallet] = int((pool * bal_i) // denom)
+    community_weights, power_weights, portal_alloc = _fetch_registered_weights(conn, settings)
+
+    community_alloc = _alloc_proportional(community_pool, community_weights)
+    power_alloc = _alloc_proportional(power_pool, power_weights)
 
     return {"community": community_alloc, "power": power_alloc, "portal": portal_alloc}
 
 
-def compute_allocations(conn: sqlite3.Connection, settings: Settings | None = None) -> dict[str, dict[str, int]]:
-    settings = settings or get_settings()
+def _shared_allocations(conn: sqlite3.Connection, settings: Settings) -> dict[str, dict[str, int]]:
+    """Return allocation maps without copying; callers must treat them as read-only.
+
+    On a cache hit this is the cached value itself, so single-wallet lookups stay O(1)
+    instead of cloning every wallet's allocation.
+    """
     version_before = _allocation_version(conn)
+    if version_before[0] == 0:
+        # no registered wallets: nothing to allocate
+        return {"community": {}, "power": {}, "portal": {}}
     settings_sig = _settings_signature(settings)
 
     with _ALLOC_CACHE_LOCK:
         cached = _ALLOC_CACHE
         if cached["version"] == version_before and cached["settings"] == settings_sig and cached["value"] is not None:
-            return _clone_allocations(cached["value"])
+            return cached["value"]
 
     allocs = _compute_allocations_internal(conn, settings)
     version_after = _allocation_version(conn)
     if version_before != version_after:
         return allocs
 
-    allocs_copy = _clone_allocations(allocs)
     with _ALLOC_CACHE_LOCK:
         _ALLOC_CACHE["version"] = version_after
         _ALLOC_CACHE["settings"] = settings_sig
-        _ALLOC_CACHE["value"] = allocs_copy
-    return _clone_allocations(allocs_copy)
+        _ALLOC_CACHE["value"] = allocs
+    return allocs
 
 
-def airdrop_for_wallet(conn: sqlite3.Connection, wallet_id: str, settings: Settings | None = None) -> int:
+def compute_allocations(conn: sqlite3.Connection, settings: Settings | None = None) -> dict[str, Mapping[str, int]]:
+    """Return per-role allocation maps as read-only views of the cached result (no copy).
+
+    Callers that need to mutate a map must copy it, e.g. `dict(allocs["community"])`.
+    """
     settings = settings or get_settings()
-    if wallet_id == settings.admin_wallet_id:
-        return 0
-    allocs = compute_allocations(conn, settings)
-    wallet = wallet_id.upper()
+    allocs = _shared_allocations(conn, settings)
+    return {role: MappingProxyType(wallets) for role, wallets in allocs.items()}
+
+
+def compute_breakdown_map(conn: sqlite3.Connection, settings: Settings | None = None) -> dict[str, dict[str, int]]:
+    """Return {wallet_id: {"community", "portal", "power"}} for every allocated wallet.
+
+    Built in one pass over the allocation maps; bulk readers should index into this
+    instead of calling airdrop_breakdown_for_wallet per wallet.
+    """
+    settings = settings or get_settings()
+    allocs = _shared_allocations(conn, settings)
+    out: dict[str, dict[str, int]] = {}
+    for role in ("community", "portal", "power"):
+        for wallet, amt in allocs[role].items():
+            entry = out.get(wallet)
+            if entry is None:
+                entry = out[wallet] = {"community": 0, "portal": 0, "power": 0}
+            entry[role] = amt
+    return out
+
+
+def airdrop_for_wallet(conn: sqlite3.Connection, wallet_id: str, settings: Settings | None = None) -> int:
     # Wallets may qualify for multiple roles; add all allocations together.
-    return int(allocs.get("community", {}).get(wallet, 0) + allocs.get("power", {}).get(wallet, 0) + allocs.get("portal", {}).get(wallet, 0))
+    return int(sum(airdrop_breakdown_for_wallet(conn, wallet_id, settings).values()))
+
 
+def airdrop_breakdown_for_wallet(
+    conn: sqlite3.Connection,
+    wallet_id: str,
+    settings: Settings | None = None,
+    *,
+    registered: bool | None = None,
+) -> dict[str, int]:
+    """Return per-role airdrop amounts for the given wallet (admin gets zeros).
 
-def airdrop_breakdown_for_wallet(conn: sqlite3.Connection, wallet_id: str, settings: Settings | None = None) -> dict[str, int]:
-    """Return per-role airdrop amounts for the given wallet (admin gets zeros)."""
+    Callers that have just read users.access_info can pass `registered` to skip the lookup.
+    """
     settings = settings or get_settings()
     wallet = wallet_id.upper()
     if wallet == settings.admin_wallet_id:
         return {"community": 0, "portal": 0, "power": 0}
-    allocs = compute_allocations(conn, settings)
+    # unregistered wallets never receive an allocation; answer from one indexed lookup
+    # instead of probing (and possibly recomputing) every wallet's share
+    if registered is None:
+        registered = is_registered(conn, wallet)
+    if not registered:
+        return {"community": 0, "portal": 0, "power": 0}
+    allocs = _shared_allocations(conn, settings)
     return {
-        "community": int(allocs.get("community", {}).get(wallet, 0)),
-        "portal": int(allocs.get("portal", {}).get(wallet, 0)),
-        "power": int(allocs.get("power", {}).get(wallet, 0)),
+        "community": allocs["community"].get(wallet, 0),
+        "portal": allocs["portal"].get(wallet, 0),
+        "power": allocs["power"].get(wallet, 0),
     }
 
 
 def recompute_and_store(conn: sqlite3.Connection, settings: Settings | None = None) -> None:
     """Recompute allocations and persist res.airdrop_amt for registered wallets."""
     settings = settings or get_settings()
-    allocs = compute_allocations(conn, settings)
-    all_wallets = set(allocs.get("community", {}).keys()) | set(allocs.get("power", {}).keys()) | set(allocs.get("portal", {}).keys())
+    breakdowns = compute_breakdown_map(conn, settings)
+    totals = {wallet: sum(b.values()) for wallet, b in breakdowns.items()}
 
     with conn:
-        for wallet in all_wallets:
-            amt = int(
-                allocs.get("community", {}).get(wallet, 0)
-                + allocs.get("power", {}).get(wallet, 0)
-                + allocs.get("portal", {}).get(wallet, 0)
-            )
-            update_airdrop_amount(conn, wallet, amt)
+        # take the write lock up front rather than upgrading a deferred transaction mid-batch
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        replace_airdrop_amounts(conn, totals)
@@ -1,106 +1,114 @@
 from __future__ import annotations
 
-from typing import Any
+import asyncio
+from typing import Any, Iterable, Tuple
 
 from app.services.rpc import QubicRpcClient
 
+# (asset name, issuer identity or None for any, managing contract index or None for any)
+AssetTarget = Tuple[str, "str | None", "int | None"]
 
-async def fetch_qearn_amount(rpc: QubicRpcClient, identity: str) -> int:
-    """Fetch QEARN token units for a given identity.
+# QX managing contract index is typically 1
+_QEARN_TARGET: AssetTarget = ("QEARN", None, 1)
+_PORTAL_TARGET: AssetTarget = ("PORTAL", None, 1)
 
-    Uses the public assets API; returns 0 if not found.
-    """
-    owned = await rpc.get_owned_assets(identity)
-    best = 0
-    for item in owned:
-        data = item.get("data") or {}
-        issued = data.get("issuedAsset") or {}
-        name = (issued.get("name") or "").upper()
-        if name != "QEARN":
-            continue
-        # QX managing contract index is typically 1
-        mci = data.get("managingContractIndex")
-        try:
-            if mci is not None and int(mci) != 1:
-                continue
-        except Exception:
-            pass
-        units = data.get("numberOfUnits")
-        try:
-            best = max(best, int(units))
-        except Exception:
-            continue
-    return best
-
-async def fetch_portal_amount(rpc: QubicRpcClient, identity: str) -> int:
-    """Fetch PORTAL token units for a given identity.
 
-    Uses the public assets API; returns 0 if not found.
-    """
-    owned = await rpc.get_owned_assets(identity)
-    best = 0
-    for item in owned:
-        data = item.get("data") or {}
-        issued = data.get("issuedAsset") or {}
-        name = (issued.get("name") or "").upper()
-        if name != "PORTAL":
-            continue
-        # QX managing contract index is typically 1
-        mci = data.get("managingContractIndex")
-        try:
-            if mci is not None and int(mci) != 1:
-                continue
-        except Exception:
-            pass
-        units = data.get("numberOfUnits")
-        try:
-            best = max(best, int(units))
-        except Exception:
-            continue
-    return best
+def _as_int(value: Any) -> int | None:
+    """int(value), or None when it isn't int-like. Plain ints and digit strings skip the try."""
+    if value.__class__ is int:
+        return value
+    if isinstance(value, str) and value.isdecimal():
+        return int(value)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
 
 
-async def fetch_asset_units(
-    rpc: QubicRpcClient,
-    identity: str,
+def scan_owned_assets(
+    owned: list[dict[str, Any]],
+    targets: Iterable[AssetTarget],
     *,
-    asset_name: str,
-    issuer_id: str | None = None,
-    managing_contract_index: int | None = 1,
-) -> int:
-    """Fetch an issued asset's numberOfUnits for a given identity.
+    first_match: bool = False,
+) -> dict[AssetTarget, int]:
+    """Return the max numberOfUnits for each target in a single pass over `owned`.
 
-    The public assets API may return multiple entries; we return the max units for safety.
+    The public assets API may return multiple entries per asset; the max is kept for
+    safety. With `first_match` the API is trusted to return one entry per asset: each
+    target takes its first positive match and the scan stops once all are resolved.
+    Targets with no matching entry map to 0.
     """
-    owned = await rpc.get_owned_assets(identity)
-    best = 0
-    target_name = (asset_name or "").strip().upper()
-    target_issuer = (issuer_id or "").strip().upper()
+    out: dict[AssetTarget, int] = {}
+    by_name: dict[str, list[tuple[AssetTarget, str, int | None]]] = {}
+    for target in targets:
+        name, issuer, mci = target
+        out[target] = 0
+        # an unparseable index filters nothing, as before
+        mci = _as_int(mci) if mci is not None else None
+        by_name.setdefault((name or "").strip().upper(), []).append((target, (issuer or "").strip().upper(), mci))
+    unresolved = len(out)
+
     for item in owned:
         data = item.get("data") or {}
         issued = data.get("issuedAsset") or {}
-        name = (issued.get("name") or "").upper()
-        if name != target_name:
-            continue
-        if target_issuer:
-            issuer = (issued.get("issuerIdentity") or issued.get("issuerId") or "").upper()
-            if issuer and issuer != target_issuer:
+        # names usually arrive uppercase already; only fold case on a miss
+        raw_name = issued.get("name") or ""
+        matches = by_name.get(raw_name)
+        if matches is None:
+            matches = by_name.get(raw_name.upper())
+            if matches is None:
                 continue
-        if managing_contract_index is not None:
-            mci = data.get("managingContractIndex")
-            try:
-                if mci is not None and int(mci) != int(managing_contract_index):
-                    continue
-            except Exception:
-                pass
-        units = data.get("numberOfUnits")
-        try:
-            best = max(best, int(units))
-        except Exception:
+        units = _as_int(data.get("numberOfUnits"))
+        if units is None:
             continue
-    return best
+        item_mci = data.get("managingContractIndex")
+        if item_mci is not None:
+            item_mci = _as_int(item_mci)
+        for target, issuer, mci in matches:
+            if issuer:
+                item_issuer = issued.get("issuerIdentity") or issued.get("issuerId") or ""
+                if item_issuer and item_issuer != issuer and item_issuer.upper() != issuer:
+                    continue
+            if mci is not None and item_mci is not None and item_mci != mci:
+                continue
+            if units > out[target]:
+                if first_match:
+                    if out[target]:
+                        continue
+                    unresolved -= 1
+                out[target] = units
+        if first_match and not unresolved:
+            break
+    return out
 
 
-async def fetch_qxmr_amount(rpc: QubicRpcClient, identity: str, *, issuer_id: str | None = None) -> int:
-    """Fetch QXMR units for a given identity (used for power pool weights)."""
-    return await fetch_asset_units(rpc, identity, asset_name="QXMR", issuer_id=issuer_id)
+async def fetch_balance_bundle(rpc: QubicRpcClient, identity: str, *, qxmr_issuer_id: str | None = None) -> dict[str, int]:
+    """Fetch the QU balance and QEARN/PORTAL/QXMR units for an identity.
+
+    All three assets come from the same owned-assets endpoint, so it is requested once
+    (concurrently with the balance) and scanned once. A failed call yields 0s.
+    """
+    balance, owned = await asyncio.gather(
+        rpc.get_balance(identity),
+        rpc.get_owned_assets(identity),
+        return_exceptions=True,
+    )
+    for result in (balance, owned):
+        if isinstance(result, BaseException) and not isinstance(result, Exception):
+            raise result
+    if isinstance(balance, Exception):
+        balance = 0
+    if isinstance(owned, Exception):
+        owned = []
+    qxmr_target: AssetTarget = ("QXMR", qxmr_issuer_id, 1)
+    units = scan_owned_assets(
+        owned,
+        (_QEARN_TARGET, _PORTAL_TARGET, qxmr_target),
+        first_match=rpc.settings.strict_asset_uniqueness,
+    )
+    return {
+        "qubic_bal": int(balance),
+        "qearn_bal": units[_QEARN_TARGET],
+        "portal_bal": units[_PORTAL_TARGET],
+        "qxmr_bal": units[qxmr_target],
+    }
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
 import asyncio
+import random
+import time
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Hashable, Optional
 
 import httpx
+import orjson
 
 from app.core.config import Settings, get_settings
 
@@ -26,19 +29,113 @@ class TxDetails:
     money_flew: bool
 
 
+# One pooled client for the whole process so repeated RPC calls (notably the
+# get_tx_details polling loop) reuse keep-alive connections instead of paying a
+# TCP+TLS handshake per request. Closed by the app lifespan on shutdown.
+_SHARED_CLIENT: httpx.AsyncClient | None = None
+
+
+def _shared_client() -> httpx.AsyncClient:
+    global _SHARED_CLIENT
+    if _SHARED_CLIENT is None or _SHARED_CLIENT.is_closed:
+        _SHARED_CLIENT = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=15.0),
+        )
+    return _SHARED_CLIENT
+
+
+# Resolves a shared in-flight load whose loader was cancelled: waiters retry the load.
+_RELOAD = object()
+
+
+class _TtlCache:
+    """Small FIFO-bounded TTL cache with single-flight loading.
+
+    Concurrent misses for the same key share one upstream call; errors are never cached.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: dict[Hashable, tuple[float, Any]] = {}
+        self._inflight: dict[Hashable, asyncio.Future[Any]] = {}
+
+    async def get(self, key: Hashable, ttl: float, load: Callable[[], Awaitable[Any]]) -> Any:
+        if ttl <= 0:
+            return await load()
+
+        loop = asyncio.get_running_loop()
+        while True:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] > time.monotonic():
+                return hit[1]
+
+            pending = self._inflight.get(key)
+            if pending is not None and pending.get_loop() is loop:
+                value = await asyncio.shield(pending)
+                if value is _RELOAD:
+                    continue  # the loading request was cancelled; load again on our own behalf
+                return value
+
+            fut: asyncio.Future[Any] = loop.create_future()
+            self._inflight[key] = fut
+            try:
+                value = await load()
+            except asyncio.CancelledError:
+                # only this request was cancelled; hand the load to whoever is still waiting
+                fut.set_result(_RELOAD)
+                raise
+            except BaseException as e:
+                fut.set_exception(e)
+                fut.exception()  # mark retrieved when nobody else was waiting
+                raise
+            else:
+                fut.set_result(value)
+                self._entries.pop(key, None)
+                self._entries[key] = (time.monotonic() + ttl, value)
+                while len(self._entries) > self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+                return value
+            finally:
+                if self._inflight.get(key) is fut:
+                    del self._inflight[key]
+
+    def invalidate(self, identity: str) -> None:
+        for key in [k for k in self._entries if k[-1] == identity]:
+            del self._entries[key]
+
+
+# Tick info moves every few seconds and owned assets rarely change within a burst of
+# summary requests, so both are served from a short-lived process-wide cache.
+_RPC_CACHE = _TtlCache()
+
+
 class QubicRpcClient:
     def __init__(self, settings: Optional[Settings] = None):
         self.settings = settings or get_settings()
 
+    @staticmethod
+    async def aclose() -> None:
+        """Close the shared HTTP client (call once on app shutdown)."""
+        global _SHARED_CLIENT
+        client, _SHARED_CLIENT = _SHARED_CLIENT, None
+        if client is not None:
+            await client.aclose()
+
+    @staticmethod
+    def invalidate(identity: str) -> None:
+        """Drop cached per-identity responses (e.g. after a confirmed transfer)."""
+        _RPC_CACHE.invalidate(identity.upper())
+
     async def _get_json(self, url: str, *, params: dict[str, Any] | None = None, timeout: float = 30) -> dict[str, Any]:
         try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                r = await client.get(url, params=params)
-                r.raise_for_status()
-                data = r.json()
-                if not isinstance(data, dict):
-                    raise RpcError("RPC returned non-object JSON")
-                return data
+            r = await _shared_client().get(url, params=params, timeout=timeout)
+            r.raise_for_status()
+            # parse the raw body directly; skips httpx's charset detection and str decode
+            data = orjson.loads(r.content)
+            if not isinstance(data, dict):
+                raise RpcError("RPC returned non-object JSON")
+            return data
         except httpx.HTTPStatusError as e:
             raise RpcError(f"RPC HTTP {e.response.status_code} for {url}") from e
         except httpx.RequestError as e:
@@ -47,6 +144,10 @@ class QubicRpcClient:
             raise RpcError(f"RPC JSON parse error for {url}") from e
 
     async def get_tick(self) -> int:
+        base = self.settings.rpc_base_url
+        return await _RPC_CACHE.get(("tick", base), self.settings.rpc_tick_ttl_seconds, self._fetch_tick)
+
+    async def _fetch_tick(self) -> int:
         data = await self._get_json(f"{self.settings.rpc_base_url}/v1/tick-info", timeout=20)
         tick_info = data.get("tickInfo") or {}
         tick = tick_info.get("tick")
@@ -62,6 +163,15 @@ class QubicRpcClient:
         return int(bal)
 
     async def get_owned_assets(self, identity: str) -> list[dict[str, Any]]:
+        key = ("owned", self.settings.api_base_url, identity.upper())
+        owned = await _RPC_CACHE.get(
+            key,
+            self.settings.rpc_owned_assets_ttl_seconds,
+            lambda: self._fetch_owned_assets(identity),
+        )
+        return list(owned)
+
+    async def _fetch_owned_assets(self, identity: str) -> list[dict[str, Any]]:
         data = await self._get_json(f"{self.settings.api_base_url}/v1/assets/{identity}/owned", timeout=30)
         owned = data.get("ownedAssets")
         if owned is None:
@@ -85,6 +195,26 @@ class QubicRpcClient:
             money_flew=bool(money_flew),
         )
 
+    @staticmethod
+    def _find_transfer(data: dict[str, Any], tx_id: str) -> dict[str, Any] | None:
+        """First transfer entry for `tx_id` in a transfers response, else None."""
+        tx_groups = (
+            (data.get("data") or {}).get("transactions")
+            or data.get("transactions")
+            or []
+        )
+        # group can be dict-like: {"transactions": [...]}
+        return next(
+            (
+                e
+                for g in tx_groups
+                if isinstance(g, dict)
+                for e in g.get("transactions", ())
+                if (e.get("transaction") or {}).get("txId") == tx_id
+            ),
+            None,
+        )
+
     async def get_tx_details(
         self,
         identity: str,
@@ -93,12 +223,20 @@ class QubicRpcClient:
         lookback_ticks: int = 5000,
         lookahead_ticks: int = 50,
         max_retries: int = 8,
-        retry_delay_seconds: float = 2.5,
+        retry_delay_seconds: float = 1.0,
+        max_delay_seconds: float = 4.0,
+        deadline_seconds: float = 30.0,
     ) -> TxDetails:
         """
         Reliable tx lookup:
         - Poll identity transfer history until the tx appears and is finalized.
         - This avoids “tx not found” right after broadcast.
+        - Delays back off exponentially with jitter (so concurrent polls don't retry in
+          lockstep) and polling stops once `deadline_seconds` would be exceeded.
+
+        With the defaults polls are ~1s, 2s, 4s, 4s, ... apart (x0.5-1.5 jitter), so a tx
+        that finalizes shortly after the first miss is seen within a few seconds. Worst
+        case the lookup gives up after ~30s of waiting plus the last poll's RPC time.
         """
         # Some RPC nodes use different paths; try a small set.
         transfer_paths = [
@@ -107,43 +245,51 @@ class QubicRpcClient:
         ]
 
         last_err: Optional[Exception] = None
+        deadline = time.monotonic() + deadline_seconds
 
         for attempt in range(1, max_retries + 1):
             try:
                 tick = await self.get_tick()
-                start = max(0, tick - (lookback_ticks * attempt))  # widen window each retry
+                # double the window each retry, up to 16x
+                start = max(0, tick - (lookback_ticks << min(attempt - 1, 4)))
                 end = tick + lookahead_ticks
 
                 params = {"startTick": start, "endTick": end}
 
-                for url in transfer_paths:
-                    data = await self._get_json(url, params=params, timeout=45)
-
-                    tx_groups = (
-                        (data.get("data") or {}).get("transactions")
-                        or data.get("transactions")
-                        or []
-                    )
-
-                    for group in tx_groups:
-                        # group can be dict-like: {"transactions": [...]}
-                        entries = group.get("transactions", []) if isinstance(group, dict) else []
-                        for entry in entries:
-                            tx = entry.get("transaction") or {}
-                            if tx.get("txId") == tx_id:
-                                money_flew = bool(entry.get("moneyFlew", False))
-                                # If tx is found but not finalized yet, keep polling.
-                                if not money_flew:
-                                    last_err = RpcError("transaction found but not finalized yet (moneyFlew=false)")
-                                    break
-                                return self._parse_tx(tx, money_flew=money_flew)
+                # Probe every transfer path concurrently and take the first one that has
+                # the finalized tx, so a slow or failing node doesn't serialize the lookup.
+                tasks = [asyncio.create_task(self._get_json(url, params=params, timeout=45)) for url in transfer_paths]
+                errors: list[Exception] = []
+                try:
+                    for next_done in asyncio.as_completed(tasks):
+                        try:
+                            data = await next_done
+                        except Exception as e:
+                            errors.append(e)
+                            continue
+                        entry = self._find_transfer(data, tx_id)
+                        if entry is None:
+                            continue
+                        # If tx is found but not finalized yet, keep polling.
+                        if not entry.get("moneyFlew", False):
+                            continue
+                        return self._parse_tx(entry["transaction"], money_flew=True)
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
 
+                if len(errors) == len(tasks):
+                    raise errors[0]
                 # not found yet
                 last_err = RpcError("transaction not found yet")
             except Exception as e:
                 last_err = e
 
             if attempt < max_retries:
-                await asyncio.sleep(retry_delay_seconds)
+                delay = min(max_delay_seconds, retry_delay_seconds * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                if time.monotonic() + delay > deadline:
+                    break
+                await asyncio.sleep(delay)
 
         raise RpcError(str(last_err) if last_err else "transaction lookup failed")
@@ -1,61 +1,109 @@
 from __future__ import annotations
 
 import sqlite3
-from typing import Iterable, Tuple, TYPE_CHECKING
+from typing import Iterable, Mapping, Tuple, TYPE_CHECKING
+
+import orjson
 
 if TYPE_CHECKING:  # pragma: no cover
     from app.core.config import Settings
 
 
+# Statements live at module level so every call hands sqlite3 the same string
+# and hits its per-connection statement cache.
+
+# Writers open with BEGIN IMMEDIATE, so any write statement takes the database write
+# lock even when its guard matches no row. The helpers below read first and only
+# issue the (still guarded) upsert when something actually changes.
+_SQL_GET_USER = "SELECT role, access_info FROM users WHERE wallet_id = ?"
+# only the existence bit is needed; no column values are materialized
+_SQL_IS_REGISTERED = "SELECT 1 FROM users WHERE wallet_id = ? AND access_info = 1"
+_SQL_GET_RES = "SELECT qubic_bal, qearn_bal, portal_bal, qxmr_bal, airdrop_amt FROM res WHERE wallet_id = ?"
+
+_SQL_ENSURE_USER = """
+INSERT INTO users(wallet_id, role, access_info) VALUES (?, ?, ?)
+ON CONFLICT(wallet_id) DO UPDATE
+SET role = 'admin', access_info = 1, updated_at = datetime('now')
+WHERE excluded.role = 'admin' AND (lower(users.role) <> 'admin' OR users.access_info <> 1)
+"""
+
+# never downgrade admin
+_SQL_SET_USER_ROLE = """
+INSERT INTO users(wallet_id, role, access_info) VALUES (?, ?, 0)
+ON CONFLICT(wallet_id) DO UPDATE
+SET role = excluded.role, updated_at = datetime('now')
+WHERE users.role <> excluded.role AND (lower(users.role) <> 'admin' OR excluded.role = 'admin')
+"""
+
+_SQL_UPSERT_RES_SNAPSHOT = """
+INSERT INTO res(wallet_id, qubic_bal, qearn_bal, portal_bal, qxmr_bal, updated_at)
+VALUES (?, ?, ?, ?, ?, datetime('now'))
+ON CONFLICT(wallet_id) DO UPDATE
+SET qubic_bal = excluded.qubic_bal,
+    qearn_bal = excluded.qearn_bal,
+    portal_bal = excluded.portal_bal,
+    qxmr_bal = excluded.qxmr_bal,
+    updated_at = datetime('now')
+WHERE res.qubic_bal <> excluded.qubic_bal
+   OR res.qearn_bal <> excluded.qearn_bal
+   OR res.portal_bal <> excluded.portal_bal
+   OR res.qxmr_bal <> excluded.qxmr_bal
+"""
+
+_SQL_UPDATE_AIRDROP_AMOUNT = """
+INSERT INTO res(wallet_id, airdrop_amt) VALUES (?, ?)
+ON CONFLICT(wallet_id) DO UPDATE
+SET airdrop_amt = excluded.airdrop_amt, updated_at = datetime('now')
+WHERE res.airdrop_amt <> excluded.airdrop_amt
+"""
+
+# The full amounts map is bound as one JSON array of [wallet_id, amt] pairs, so both
+# statements are constant regardless of wallet count (no placeholder lists to build).
+_SQL_UPSERT_AIRDROP_AMOUNTS = """
+INSERT INTO res(wallet_id, airdrop_amt, updated_at)
+SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), datetime('now') FROM json_each(?) WHERE true
+ON CONFLICT(wallet_id) DO UPDATE
+SET airdrop_amt = excluded.airdrop_amt, updated_at = datetime('now')
+WHERE res.airdrop_amt <> excluded.airdrop_amt
+"""
+
+_SQL_RESET_UNLISTED_AIRDROP = """
+UPDATE res
+SET airdrop_amt = 0, updated_at = datetime('now')
+WHERE airdrop_amt <> 0 AND wallet_id NOT IN (SELECT json_extract(value, '$[0]') FROM json_each(?))
+"""
+
+
+def is_registered(conn: sqlite3.Connection, wallet_id: str) -> bool:
+    """True when `wallet_id` has a users row with access_info = 1."""
+    return conn.execute(_SQL_IS_REGISTERED, (wallet_id.upper(),)).fetchone() is not None
+
+
 def ensure_user(conn: sqlite3.Connection, wallet_id: str, settings: "Settings") -> bool:
     """Ensure `users` row exists; admins stay admin. Returns True if mutated."""
     wallet = wallet_id.upper()
-    row = conn.execute(
-        "SELECT role, access_info FROM users WHERE wallet_id = ?",
-        (wallet,),
-    ).fetchone()
     is_admin = wallet == settings.admin_wallet_id
-    if row is None:
-        conn.execute(
-            "INSERT INTO users(wallet_id, role, access_info) VALUES (?, ?, ?)",
-            (wallet, "admin" if is_admin else "community", 1 if is_admin else 0),
-        )
-        return True
-    if is_admin:
-        role = str(row["role"] or "").lower()
-        access = int(row["access_info"] or 0)
-        if role != "admin" or access != 1:
-            conn.execute(
-                "UPDATE users SET role='admin', access_info=1, updated_at=datetime('now') WHERE wallet_id = ?",
-                (wallet,),
-            )
-            return True
-    return False
+    row = conn.execute(_SQL_GET_USER, (wallet,)).fetchone()
+    if row is not None and (not is_admin or (str(row[0] or "").lower() == "admin" and row[1] == 1)):
+        return False
+    # insert if missing, or re-assert admin role/access when it drifted
+    cur = conn.execute(
+        _SQL_ENSURE_USER,
+        (wallet, "admin" if is_admin else "community", 1 if is_admin else 0),
+    )
+    return cur.rowcount > 0
 
 
 def set_user_role(conn: sqlite3.Connection, wallet_id: str, role_csv: str) -> bool:
     """Update users.role when it meaningfully changes. Returns True if mutated."""
     wallet = wallet_id.upper()
-    existing = conn.execute(
-        "SELECT role FROM users WHERE wallet_id = ?",
-        (wallet,),
-    ).fetchone()
-    if existing is None:
-        conn.execute(
-            "INSERT INTO users(wallet_id, role, access_info) VALUES (?, ?, 0)",
-            (wallet, role_csv),
-        )
-        return True
-    current = str(existing["role"] or "")
-    if current == role_csv:
-        return False
-    if current.lower() == "admin" and role_csv != "admin":
-        return False  # never downgrade admin
-    conn.execute(
-        "UPDATE users SET role = ?, updated_at = datetime('now') WHERE wallet_id = ?",
-        (role_csv, wallet),
-    )
-    return True
+    row = conn.execute(_SQL_GET_USER, (wallet,)).fetchone()
+    if row is not None:
+        current = str(row[0] or "")
+        if current == role_csv or (current.lower() == "admin" and role_csv != "admin"):
+            return False  # unchanged, or would downgrade admin
+    cur = conn.execute(_SQL_SET_USER_ROLE, (wallet, role_csv))
+    return cur.rowcount > 0
 
 
 def upsert_res_snapshot(
@@ -69,65 +117,30 @@ def upsert_res_snapshot(
 ) -> bool:
     """Persist the balance snapshot if it changed. Returns True when mutated."""
     wallet = wallet_id.upper()
-    existing = conn.execute(
-        """
-        SELECT qubic_bal, qearn_bal, portal_bal, qxmr_bal
-        FROM res
-        WHERE wallet_id = ?
-        """,
-        (wallet,),
-    ).fetchone()
-    payload = (
-        int(qubic_bal),
-        int(qearn_bal),
-        int(portal_bal),
-        int(qxmr_bal),
-    )
-    if existing is None:
-        conn.execute(
-            """
-            INSERT INTO res(wallet_id, qubic_bal, qearn_bal, portal_bal, qxmr_bal, updated_at)
-            VALUES (?, ?, ?, ?, ?, datetime('now'))
-            """,
-            (wallet, *payload),
-        )
-        return True
-
-    stored = (
-        int(existing["qubic_bal"] or 0),
-        int(existing["qearn_bal"] or 0),
-        int(existing["portal_bal"] or 0),
-        int(existing["qxmr_bal"] or 0),
-    )
-    if stored == payload:
+    payload = (int(qubic_bal), int(qearn_bal), int(portal_bal), int(qxmr_bal))
+    row = conn.execute(_SQL_GET_RES, (wallet,)).fetchone()
+    if row is not None and tuple(row[:4]) == payload:
         return False
-
-    conn.execute(
-        """
-        UPDATE res
-        SET qubic_bal = ?, qearn_bal = ?, portal_bal = ?, qxmr_bal = ?, updated_at = datetime('now')
-        WHERE wallet_id = ?
-        """,
-        (*payload, wallet),
-    )
-    return True
+    cur = conn.execute(_SQL_UPSERT_RES_SNAPSHOT, (wallet, *payload))
+    return cur.rowcount > 0
 
 
 def update_airdrop_amount(conn: sqlite3.Connection, wallet_id: str, amount: int) -> bool:
     """Update res.airdrop_amt when it changes. Returns True if mutated."""
     wallet = wallet_id.upper()
-    conn.execute("INSERT OR IGNORE INTO res(wallet_id) VALUES (?)", (wallet,))
-    row = conn.execute(
-        "SELECT airdrop_amt FROM res WHERE wallet_id = ?",
-        (wallet,),
-    ).fetchone()
-    current = int(row["airdrop_amt"] or 0) if row else 0
-    target = int(amount)
-    if current == target:
+    row = conn.execute(_SQL_GET_RES, (wallet,)).fetchone()
+    if row is not None and row[4] == int(amount):
         return False
-    conn.execute(
-        "UPDATE res SET airdrop_amt = ?, updated_at = datetime('now') WHERE wallet_id = ?",
-        (target, wallet),
-    )
-    return True
+    cur = conn.execute(_SQL_UPDATE_AIRDROP_AMOUNT, (wallet, int(amount)))
+    return cur.rowcount > 0
+
+
+def replace_airdrop_amounts(conn: sqlite3.Connection, amounts: Mapping[str, int]) -> None:
+    """Persist res.airdrop_amt for every wallet in `amounts`; reset all other rows to 0.
 
+    Two statements regardless of wallet count: one upsert over the JSON-bound amounts
+    (unchanged rows are skipped) and one reset of every wallet not listed.
+    """
+    payload = orjson.dumps([(wallet.upper(), int(amt)) for wallet, amt in amounts.items()]).decode()
+    conn.execute(_SQL_UPSERT_AIRDROP_AMOUNTS, (payload,))
+    conn.execute(_SQL_RESET_UNLISTED_AIRDROP, (payload,))
@@ -2,7 +2,38 @@
 
 Run locally:
   python migrate.py
-  uvicorn main:app --reload --port 8000
+  DEV=1 python main.py            # auto-reload on code changes
+
+Production:
+  WEB_CONCURRENCY=4 HOST=0.0.0.0 python main.py
+
+uvicorn[standard] ships uvloop and httptools; uvicorn picks them automatically
+(falling back to asyncio/h11 where unavailable, e.g. Windows). Reload is only
+enabled with DEV=1 since its file watcher and single-process supervisor have no
+place in production.
+
+Multiple workers are safe: the database runs in WAL mode, so worker processes read
+concurrently and queue on SQLite's write lock (busy_timeout) rather than failing.
+Each worker keeps its own connection pool, RPC cache and allocation cache; the
+latter is keyed on the database contents, so workers never serve each other's
+stale allocations.
 """
 
+import os
+
 from app.main import app  # noqa: F401
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    from app.core.config import _env_bool
+
+    dev = _env_bool("DEV", False)
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "8000")),
+        reload=dev,
+        workers=None if dev else int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from app.services.assets import fetch_balance_bundle, scan_owned_assets
+
+ISSUER = "Q" * 60
+OTHER = "Z" * 60
+
+
+def _entry(name, units, *, issuer=None, mci=1):
+    issued = {"name": name}
+    if issuer is not None:
+        issued["issuerIdentity"] = issuer
+    data = {"issuedAsset": issued, "numberOfUnits": units}
+    if mci is not None:
+        data["managingContractIndex"] = mci
+    return {"data": data}
+
+
+class ScanOwnedAssetsTest(unittest.TestCase):
+    def test_matches_by_issuer(self):
+        target = ("QXMR", ISSUER, 1)
+        owned = [_entry("QXMR", 50, issuer=OTHER), _entry("qxmr", 7, issuer=ISSUER.lower())]
+        self.assertEqual(scan_owned_assets(owned, [target]), {target: 7})
+        # entries without an issuer are not filtered out
+        self.assertEqual(scan_owned_assets([_entry("QXMR", 3)], [target]), {target: 3})
+
+    def test_matches_by_managing_contract_index(self):
+        target = ("QEARN", None, 1)
+        owned = [_entry("QEARN", 90, mci=2), _entry("QEARN", 4, mci="1")]
+        self.assertEqual(scan_owned_assets(owned, [target]), {target: 4})
+        self.assertEqual(scan_owned_assets([_entry("QEARN", 5, mci=None)], [target]), {target: 5})
+        # a target without an index accepts any
+        self.assertEqual(scan_owned_assets(owned, [("QEARN", None, None)]), {("QEARN", None, None): 90})
+
+    def test_duplicates_keep_max_or_first_match(self):
+        target = ("PORTAL", None, 1)
+        owned = [_entry("PORTAL", 0), _entry("PORTAL", 3), _entry("PORTAL", 9)]
+        self.assertEqual(scan_owned_assets(owned, [target]), {target: 9})
+        # strict_asset_uniqueness: first positive entry wins
+        self.assertEqual(scan_owned_assets(owned, [target], first_match=True), {target: 3})
+
+    def test_bad_or_missing_units_are_skipped(self):
+        target = ("QEARN", None, 1)
+        owned = [_entry("QEARN", "abc"), _entry("QEARN", None), {"data": {"issuedAsset": {"name": "QEARN"}}}, _entry("QEARN", "12")]
+        self.assertEqual(scan_owned_assets(owned, [target]), {target: 12})
+        self.assertEqual(scan_owned_assets(owned[:3], [target]), {target: 0})
+
+    def test_unmatched_targets_are_zero(self):
+        targets = [("QEARN", None, 1), ("PORTAL", None, 1)]
+        self.assertEqual(scan_owned_assets([_entry("OTHER", 5)], targets), {t: 0 for t in targets})
+
+
+class _FakeRpc:
+    def __init__(self, *, balance=10, owned=(), strict=False):
+        self.settings = SimpleNamespace(strict_asset_uniqueness=strict)
+        self._balance = balance
+        self._owned = owned
+
+    async def get_balance(self, identity):
+        if isinstance(self._balance, Exception):
+            raise self._balance
+        return self._balance
+
+    async def get_owned_assets(self, identity):
+        if isinstance(self._owned, Exception):
+            raise self._owned
+        return list(self._owned)
+
+
+class FetchBalanceBundleTest(unittest.TestCase):
+    owned = [_entry("QEARN", 2), _entry("PORTAL", 3), _entry("QXMR", 4, issuer=ISSUER), _entry("QXMR", 8, issuer=OTHER)]
+
+    def _bundle(self, rpc):
+        return asyncio.run(fetch_balance_bundle(rpc, "A" * 60, qxmr_issuer_id=ISSUER))
+
+    def test_bundle(self):
+        self.assertEqual(
+            self._bundle(_FakeRpc(owned=self.owned)),
+            {"qubic_bal": 10, "qearn_bal": 2, "portal_bal": 3, "qxmr_bal": 4},
+        )
+
+    def test_failed_balance_call_falls_back_to_zero(self):
+        self.assertEqual(
+            self._bundle(_FakeRpc(balance=RuntimeError("down"), owned=self.owned)),
+            {"qubic_bal": 0, "qearn_bal": 2, "portal_bal": 3, "qxmr_bal": 4},
+        )
+
+    def test_failed_assets_call_falls_back_to_zero(self):
+        self.assertEqual(
+            self._bundle(_FakeRpc(owned=RuntimeError("down"))),
+            {"qubic_bal": 10, "qearn_bal": 0, "portal_bal": 0, "qxmr_bal": 0},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from app.core import db
+from app.core.config import get_settings
+from app.services import airdrop
+
+# Schema as shipped at v4: no case normalization yet, no CHECK on wallet_id.
+_LEGACY_V4 = """
+CREATE TABLE users (
+  wallet_id TEXT PRIMARY KEY,
+  role TEXT NOT NULL DEFAULT 'community',
+  access_info INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE TABLE res (
+  wallet_id TEXT PRIMARY KEY,
+  qubic_bal INTEGER NOT NULL DEFAULT 0,
+  qearn_bal INTEGER NOT NULL DEFAULT 0,
+  portal_bal INTEGER NOT NULL DEFAULT 0,
+  qxmr_bal INTEGER NOT NULL DEFAULT 0,
+  airdrop_amt INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+  FOREIGN KEY(wallet_id) REFERENCES users(wallet_id) ON DELETE CASCADE
+);
+CREATE TABLE transaction_log (
+  no INTEGER PRIMARY KEY AUTOINCREMENT,
+  wallet_id TEXT NOT NULL,
+  "from" TEXT NOT NULL,
+  "to" TEXT NOT NULL,
+  txId TEXT NOT NULL UNIQUE,
+  type TEXT NOT NULL,
+  amount INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE TABLE tradeins (
+  tx_id TEXT PRIMARY KEY,
+  wallet_id TEXT NOT NULL,
+  qxmr_amount INTEGER NOT NULL,
+  qdoge_amount INTEGER NOT NULL,
+  tick INTEGER NOT NULL,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  FOREIGN KEY(wallet_id) REFERENCES users(wallet_id) ON DELETE CASCADE
+);
+PRAGMA user_version = 4;
+"""
+
+A, B, C, D = ("A" * 60, "B" * 60, "C" * 60, "D" * 60)
+
+
+class WalletIdFoldMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "legacy.db")
+        os.environ["DB_PATH"] = self.path
+        get_settings.cache_clear()
+        airdrop._ALLOC_CACHE.update(version=None, settings=None, value=None)
+        self.admin = get_settings().admin_wallet_id
+
+    def tearDown(self):
+        db.close_pool()
+        get_settings.cache_clear()
+        os.environ.pop("DB_PATH", None)
+        self.tmp.cleanup()
+
+    def _build_legacy(self):
+        conn = sqlite3.connect(self.path)
+        conn.executescript(_LEGACY_V4)
+        conn.executemany(
+            "INSERT INTO users(wallet_id, access_info) VALUES (?, ?)",
+            [
+                (A, 1),
+                (A.lower(), 1),  # case duplicate of a registered wallet
+                (B, 1),
+                (C.lower(), 1),  # lowercase only
+                (D, 0),
+                (D.lower(), 1),  # only the duplicate is registered
+                (self.admin.lower(), 1),  # mixed-case admin row
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO res(wallet_id, qubic_bal) VALUES (?, ?)",
+            [(A, 100), (A.lower(), 999), (B, 100), (C.lower(), 100), (D.lower(), 100), (self.admin.lower(), 100)],
+        )
+        conn.execute("INSERT INTO tradeins(tx_id, wallet_id, qxmr_amount, qdoge_amount, tick) VALUES ('t1', ?, 1, 1, 1)", (A.lower(),))
+        conn.execute(
+            'INSERT INTO transaction_log(wallet_id, "from", "to", txId, type) VALUES (?, ?, ?, \'x1\', \'qubic\')',
+            (A.lower(), A.lower(), B),
+        )
+        conn.commit()
+        conn.close()
+
+    def test_case_duplicates_are_merged(self):
+        self._build_legacy()
+        db.init_db()
+
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA foreign_keys = ON")
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], db._SCHEMA_VERSION)
+        self.assertEqual(
+            conn.execute("SELECT wallet_id, access_info FROM users ORDER BY wallet_id").fetchall(),
+            sorted([(A, 1), (B, 1), (C, 1), (D, 1), (self.admin, 1)]),
+        )
+        # the canonical res row wins over the duplicate's balances
+        self.assertEqual(
+            conn.execute("SELECT wallet_id, qubic_bal FROM res ORDER BY wallet_id").fetchall(),
+            sorted([(A, 100), (B, 100), (C, 100), (D, 100), (self.admin, 100)]),
+        )
+        self.assertEqual(conn.execute("SELECT wallet_id FROM tradeins").fetchall(), [(A,)])
+        self.assertEqual(conn.execute("SELECT wallet_id FROM transaction_log").fetchall(), [(A,)])
+        self.assertEqual(conn.execute("PRAGMA foreign_key_check").fetchall(), [])
+        conn.close()
+
+        with db.read_conn_ctx() as conn:
+            allocs = airdrop.compute_allocations(conn, get_settings())
+        # one share per wallet; the admin is excluded
+        self.assertEqual(sorted(allocs["community"]), [A, B, C, D])
+        self.assertEqual(len(set(allocs["community"].values())), 1)
+
+    def test_fold_repairs_databases_migrated_by_the_earlier_v5(self):
+        self._build_legacy()
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA user_version = 6")
+        conn.commit()
+        conn.close()
+
+        db.init_db()
+
+        conn = sqlite3.connect(self.path)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM users WHERE wallet_id <> UPPER(wallet_id)").fetchone()[0], 0)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM res WHERE wallet_id <> UPPER(wallet_id)").fetchone()[0], 0)
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import asyncio
+import unittest
+
+from app.services.rpc import _TtlCache
+
+
+class TtlCacheSingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_cancelled_leader_does_not_cancel_follower(self):
+        cache = _TtlCache()
+        calls = 0
+        release = asyncio.Event()
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return calls
+
+        leader = asyncio.create_task(cache.get("k", 60, load))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get("k", 60, load))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await follower, 2)  # the follower re-ran the load itself
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(await cache.get("k", 60, load), 2)  # and its result was cached
+
+    async def test_followers_share_one_load(self):
+        cache = _TtlCache()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "v"
+
+        results = await asyncio.gather(*(cache.get("k", 60, load) for _ in range(5)))
+        self.assertEqual(results, ["v"] * 5)
+        self.assertEqual(calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from app.core import db
+from app.core.config import get_settings
+from app.services.storage import replace_airdrop_amounts
+
+A, B, C = ("A" * 60, "B" * 60, "C" * 60)
+_OLD = "2000-01-01 00:00:00"
+
+
+class ReplaceAirdropAmountsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.environ["DB_PATH"] = os.path.join(self.tmp.name, "storage.db")
+        get_settings.cache_clear()
+        db.init_db()
+        self.ctx = db.conn_ctx()
+        self.conn = self.ctx.__enter__()
+        self.conn.executemany("INSERT INTO users(wallet_id, access_info) VALUES (?, 1)", [(A,), (B,), (C,)])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.ctx.__exit__(None, None, None)
+        db.close_pool()
+        get_settings.cache_clear()
+        os.environ.pop("DB_PATH", None)
+        self.tmp.cleanup()
+
+    def _res(self):
+        return dict(self.conn.execute("SELECT wallet_id, airdrop_amt FROM res ORDER BY wallet_id").fetchall())
+
+    def _updated_at(self, wallet):
+        return self.conn.execute("SELECT updated_at FROM res WHERE wallet_id = ?", (wallet,)).fetchone()[0]
+
+    def test_inserts_and_updates_listed_wallets(self):
+        self.conn.execute("INSERT INTO res(wallet_id, airdrop_amt) VALUES (?, 5)", (A,))
+        replace_airdrop_amounts(self.conn, {A: 7, B: 3})
+        self.assertEqual(self._res(), {A: 7, B: 3})
+
+    def test_accepts_non_canonical_ids(self):
+        replace_airdrop_amounts(self.conn, {A.lower(): 4})
+        self.assertEqual(self._res(), {A: 4})
+
+    def test_unchanged_amount_keeps_updated_at(self):
+        self.conn.execute("INSERT INTO res(wallet_id, airdrop_amt, updated_at) VALUES (?, 7, ?)", (A, _OLD))
+        replace_airdrop_amounts(self.conn, {A: 7})
+        self.assertEqual(self._updated_at(A), _OLD)
+        replace_airdrop_amounts(self.conn, {A: 8})
+        self.assertNotEqual(self._updated_at(A), _OLD)
+
+    def test_unlisted_wallet_is_reset_to_zero(self):
+        self.conn.executemany(
+            "INSERT INTO res(wallet_id, airdrop_amt, updated_at) VALUES (?, ?, ?)",
+            [(A, 7, _OLD), (B, 3, _OLD), (C, 0, _OLD)],
+        )
+        # B was de-registered, so it no longer appears in the allocation
+        replace_airdrop_amounts(self.conn, {A: 7})
+        self.assertEqual(self._res(), {A: 7, B: 0, C: 0})
+        self.assertNotEqual(self._updated_at(B), _OLD)
+        # rows already at 0 are not rewritten
+        self.assertEqual(self._updated_at(C), _OLD)
+
+    def test_empty_map_resets_everything(self):
+        self.conn.executemany("INSERT INTO res(wallet_id, airdrop_amt) VALUES (?, ?)", [(A, 7), (B, 3)])
+        replace_airdrop_amounts(self.conn, {})
+        self.assertEqual(self._res(), {A: 0, B: 0})
+
+    def test_large_amounts_round_trip(self):
+        replace_airdrop_amounts(self.conn, {A: 2**62, B: 0})
+        self.assertEqual(self._res(), {A: 2**62, B: 0})
+
+
+if __name__ == "__main__":
+    unittest.main()